@@ -0,0 +1,176 @@
+from __future__ import annotations
+import argparse, os, subprocess, sys, statistics, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _build_assets(args):
+    from .services import assets
+    manifest = assets.build()
+    for src, out in sorted(manifest.items()):
+        print(f"{src} -> {out}")
+
+
+def _modes(mode: str) -> list[str]:
+    return ["research", "pilot"] if mode == "all" else [mode]
+
+def _migrate_layout(args):
+    from .services import exporter
+    for mode in _modes(args.mode):
+        base = exporter._dir_for_mode(mode)
+        st = exporter.migrate_layout(base)
+        print(f"[{mode}] {base}: moved {st['moved']}, indexed {st['indexed']}, skipped {len(st['skipped'])}")
+        for path in st["skipped"]:
+            print(f"  skipped {path}")
+
+def _rebuild(args):
+    from .main import _init_storage
+    from .services import rebuild
+    _init_storage()   # the DB may predate the response tables
+    for mode in _modes(args.mode):
+        st = rebuild.rebuild(mode, workers=args.workers, chunk_size=args.chunk_size)
+        print(f"[{mode}] {st['participants']} participants, {st['files']} per-participant files"
+              + (f", {st['archived']} archived left as-is" if st["archived"] else "")
+              + (f", {st['demographics_kept']} demographics files left as-is (no submission time in DB or CSV)"
+                 if st["demographics_kept"] else ""))
+        for name, rows in st["aggregates"].items():
+            print(f"  {name}: {rows} rows")
+
+def _import_responses(args):
+    from .main import _init_storage
+    from .services import rebuild
+    _init_storage()   # creates the response tables on a pre-upgrade DB
+    for mode in _modes(args.mode):
+        st = rebuild.import_responses(mode)
+        print(f"[{mode}] slider {st['tlx_slider']}, descriptive {st['tlx_descriptive']}, "
+              f"post-survey {st['post_survey']} rows imported; {st['skipped']} CSV rows without a DB session")
+
+def _archive(args):
+    from .services import archive, exporter
+    for mode in _modes(args.mode):
+        base = exporter._dir_for_mode(mode)
+        st = archive.archive_completed(base, min_idle_s=args.min_idle_hours * 3600, dry_run=args.dry_run)
+        verb = "would archive" if args.dry_run else "archived"
+        print(f"[{mode}] {verb} {st['participants']} participants into {st['shards']} shard archives "
+              f"({st['bytes_in']} bytes of CSV" + ("" if args.dry_run else f" -> +{st['bytes_out']} bytes") + ")")
+
+def _rating_jobs(args):
+    from .db import SessionLocal
+    from .main import _init_storage
+    from .services import jobs
+    _init_storage()
+    if args.drain:
+        print(f"processed {jobs.drain()} jobs")
+    with SessionLocal() as db:
+        for status, n in sorted(jobs.counts(db).items()):
+            print(f"{status:8} {n}")
+
+def _agreement(args):
+    import csv, time
+    from .services import agreement, exporter
+    t0 = time.perf_counter()
+    pairs = agreement.load_pairs(exporter._dir_for_mode(args.mode))
+    rows = agreement.analyze(pairs, n_boot=args.boot, workers=args.workers, seed=args.seed)
+    out = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    try:
+        w = csv.DictWriter(out, fieldnames=agreement.REPORT_HEADERS)
+        w.writeheader()
+        for r in rows:
+            w.writerow({k: (round(v, 4) if isinstance(v, float) else v) for k, v in r.items()})
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{len(pairs)} pairs, {args.boot} resamples, {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+
+
+_IMPORT_PROBE = (
+    "import time; t=time.perf_counter(); import {mod}; a=time.perf_counter();\n"
+    "{startup}print((a-t)*1000, (time.perf_counter()-a)*1000)"
+)
+_STARTUP_PROBE = (
+    "import asyncio\n"
+    "async def _s():\n"
+    "    async with app.main.app.router.lifespan_context(app.main.app): pass\n"
+    "asyncio.run(_s()); "
+)
+
+def _probe(mod: str, startup: bool, workdir: str) -> tuple[float, float]:
+    # Runs in a scratch dir with its own DB/DATA_DIR so the lifespan hook
+    # doesn't touch real study data.
+    code = _IMPORT_PROBE.format(mod=mod, startup=_STARTUP_PROBE if startup else "")
+    env = {**os.environ, "PYTHONPATH": str(ROOT), "DATA_DIR": os.path.join(workdir, "data"),
+           "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}"}
+    out = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env,
+                         capture_output=True, text=True, check=True)
+    imp, st = out.stdout.strip().splitlines()[-1].split()
+    return float(imp), float(st)
+
+def _bench_startup(args):
+    framework = "fastapi, fastapi.responses, sqlalchemy.orm, dotenv"
+    with tempfile.TemporaryDirectory() as wd:
+        _probe("app.main", False, wd)  # warm the bytecode cache
+        base = [_probe(framework, False, wd)[0] for _ in range(args.runs)]
+        runs = [_probe("app.main", True, wd) for _ in range(args.runs)]
+    imp = [r[0] for r in runs]
+    own = statistics.median(imp) - statistics.median(base)
+    print(f"framework imports    median {statistics.median(base):7.1f} ms  min {min(base):7.1f} ms")
+    print(f"import app.main      median {statistics.median(imp):7.1f} ms  min {min(imp):7.1f} ms")
+    print(f"  attributable to app       {own:7.1f} ms  (budget {args.budget_ms:.0f} ms)")
+    print(f"lifespan startup     median {statistics.median(r[1] for r in runs):7.1f} ms")
+    if own > args.budget_ms:
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Maintenance commands.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build-assets", help="Fingerprint and precompress static/ into static/dist/.")
+    p.set_defaults(func=_build_assets)
+
+    p = sub.add_parser("migrate-layout", help="Move flat by_participant/ folders into sharded folders + index.")
+    p.add_argument("--mode", choices=["research", "pilot", "all"], default="all")
+    p.set_defaults(func=_migrate_layout)
+
+    p = sub.add_parser("archive", help="Pack finished participants into zstd shard archives (needs zstandard).")
+    p.add_argument("--mode", choices=["research", "pilot", "all"], default="all")
+    p.add_argument("--min-idle-hours", type=float, default=24.0,
+                   help="Only folders with a post-survey and no writes for this long.")
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=_archive)
+
+    p = sub.add_parser("rebuild", help="Regenerate by_participant/ and aggregate CSVs from the database.")
+    p.add_argument("--mode", choices=["research", "pilot", "all"], default="all")
+    p.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count).")
+    p.add_argument("--chunk-size", type=int, default=200, help="Participants per DB batch / worker task.")
+    p.set_defaults(func=_rebuild)
+
+    p = sub.add_parser("import-responses", help="Backfill TLX/post-survey DB tables from existing aggregate CSVs.")
+    p.add_argument("--mode", choices=["research", "pilot", "all"], default="all")
+    p.set_defaults(func=_import_responses)
+
+    p = sub.add_parser("rating-jobs", help="Show deferred LLM rating jobs by status; --drain runs them now.")
+    p.add_argument("--drain", action="store_true", help="Process every runnable job in this process, then exit.")
+    p.set_defaults(func=_rating_jobs)
+
+    p = sub.add_parser("agreement", help="Slider vs LLM agreement (weighted kappa, ICC, MAE, Spearman) with bootstrap CIs.")
+    p.add_argument("--mode", choices=["research", "pilot"], default="research")
+    p.add_argument("--boot", type=int, default=10_000, help="Bootstrap resamples per cell.")
+    p.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count).")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="Write the CSV report here instead of stdout.")
+    p.set_defaults(func=_agreement)
+
+    p = sub.add_parser("bench-startup", help="Time `import app.main` and lifespan startup in fresh interpreters.")
+    p.add_argument("--runs", type=int, default=7)
+    p.add_argument("--budget-ms", type=float, default=200.0,
+                   help="Fail if app.main adds more than this on top of the framework imports.")
+    p.set_defaults(func=_bench_startup)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
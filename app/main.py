@@ -1,24 +1,23 @@
 from __future__ import annotations
-import os, secrets, json
+import os, secrets, json, time, threading, asyncio
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from datetime import datetime
 from pathlib import Path
 from fastapi import FastAPI, Depends, Request, Response, HTTPException, status
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from dotenv import load_dotenv
-from sqlalchemy import func, inspect
-
-from pathlib import Path
+from sqlalchemy import func, inspect, insert
 
 from .db import Base, engine, get_db
-from .models import Participant, Session as DBSession, Demographics, Level
+from .models import (Participant, Session as DBSession, Demographics, Level,
+                     TlxSliderRating, TlxDescriptiveAnswer, PostSurveyAnswer)
 from .schemas import DemographicsIn
-from .services import llm_tlx, exporter
-
-load_dotenv()
+from .services import llm_tlx, exporter, metrics, tracing, assets, aggregates, admission, tlx_cache, jobs
 
 SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_urlsafe(16))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 SESSION_COOKIE_NAME = "sid"
 SESSION_COOKIE_MAX_AGE = 60 * 60 * 24 * 7 
 
@@ -69,19 +68,84 @@ def _choose_sequence_key(mode: str) -> str:
     counts.setdefault(mode, {"A": 0, "B": 0})
     return "A" if counts[mode]["A"] <= counts[mode]["B"] else "B"
 
-app = FastAPI(title="Web Study — Sliding Puzzle")
-app.mount("/static", StaticFiles(directory=str(os.path.join(os.path.dirname(__file__), "..", "static"))), name="static")
-templates = Jinja2Templates(directory=str(os.path.join(os.path.dirname(__file__), "..", "templates")))
-
-
-Base.metadata.create_all(bind=engine)
-
+DATA_DIR = os.getenv("DATA_DIR", "./data")
 
-insp = inspect(engine)
-cols = [c['name'] for c in insp.get_columns('participants')]
-if 'participant_no' not in cols:
-    with engine.begin() as conn:
-        conn.exec_driver_sql("ALTER TABLE participants ADD COLUMN participant_no INTEGER")
+def _init_storage():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    Base.metadata.create_all(bind=engine)
+    insp = inspect(engine)
+    cols = [c['name'] for c in insp.get_columns('participants')]
+    if 'participant_no' not in cols:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE participants ADD COLUMN participant_no INTEGER")
+    if 'updated_at' not in [c['name'] for c in insp.get_columns('demographics')]:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE demographics ADD COLUMN updated_at DATETIME")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup work lives here rather than at import so that `import app.main`
+    # (every worker, every --reload) stays cheap.
+    _init_storage()
+    assets.build()
+    threading.Thread(target=llm_tlx.get_client, name="llm-warmup", daemon=True).start()
+    jobs.start()
+    yield
+    jobs.stop()
+
+app = FastAPI(title="Web Study — Sliding Puzzle", lifespan=lifespan)
+app.mount("/static", assets.AssetStaticFiles(directory=str(assets.STATIC_DIR)), name="static")
+
+@lru_cache(maxsize=1)
+def get_templates():
+    from fastapi.templating import Jinja2Templates
+    t = Jinja2Templates(directory=str(os.path.join(os.path.dirname(__file__), "..", "templates")))
+    t.env.globals["asset_url"] = assets.asset_url
+    return t
+
+metrics.instrument_engine(engine)
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    token = metrics.begin_request()
+    t0 = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.end_request(token, request.method, route, status_code, time.perf_counter() - t0)
+
+if tracing.ACTIVE:
+    tracing.instrument_engine(engine)
+
+    @app.middleware("http")
+    async def profile_slow_requests(request: Request, call_next):
+        if not tracing.wants(request):
+            return await call_next(request)
+        tr, token = tracing.start(request.method, request.url.path)
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            tracing.finish(tr, token, route, status_code)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def require_admin(request: Request):
+    # Admin endpoints are disabled entirely unless ADMIN_TOKEN is configured.
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found.")
+    if not secrets.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required.")
 
 def get_current_session(request: Request, db: Session) -> DBSession | None:
     token = request.cookies.get(SESSION_COOKIE_NAME)
@@ -89,12 +153,9 @@ def get_current_session(request: Request, db: Session) -> DBSession | None:
         return None
     return db.query(DBSession).filter(DBSession.cookie_token == token).first()
 
-DATA_DIR = os.getenv("DATA_DIR", "./data")
-os.makedirs(DATA_DIR, exist_ok=True)
-
 @app.get("/", response_class=HTMLResponse)
 def home(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return get_templates().TemplateResponse("index.html", {"request": request})
 
 @app.get("/demographics", response_class=HTMLResponse)
 def demographics_page(request: Request, db: Session = Depends(get_db)):
@@ -105,7 +166,7 @@ def demographics_page(request: Request, db: Session = Depends(get_db)):
     mode = (request.cookies.get("mode") or "research").lower()
     pno = sess.participant.participant_no if mode == "research" else None
 
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         "demographics.html",
         {"request": request, "participant_no": pno, "mode": mode}
     )
@@ -117,7 +178,7 @@ def study_page(request: Request, db: Session = Depends(get_db)):
     sess = get_current_session(request, db)
     if not sess:
         return RedirectResponse("/", status_code=status.HTTP_303_SEE_OTHER)
-    return templates.TemplateResponse("study.html", {"request": request})
+    return get_templates().TemplateResponse("study.html", {"request": request})
 
 
 @app.post("/api/consent")
@@ -188,13 +249,15 @@ def api_demographics(payload: DemographicsIn, request: Request, db: Session = De
             participant=p,
             age_band=payload.age_band,
             gender=payload.gender,
-            puzzle_experience=payload.puzzle_experience
+            puzzle_experience=payload.puzzle_experience,
+            updated_at=datetime.utcnow(),
         )
         db.add(d)
     else:
         p.demographics.age_band = payload.age_band
         p.demographics.gender = payload.gender
         p.demographics.puzzle_experience = payload.puzzle_experience
+        p.demographics.updated_at = datetime.utcnow()
 
     db.commit()
 
@@ -232,6 +295,7 @@ def api_session_start(request: Request, db: Session = Depends(get_db)):
         seq_key = "A" if counts[mode]["A"] <= counts[mode]["B"] else "B"
         counts[mode][seq_key] += 1
         _save_seq_counts(counts)
+        aggregates.observe(mode, "sequence", seq_key, 1.0)
 
     seq_def = SEQS_2R[seq_key]
     plan = []
@@ -326,11 +390,76 @@ async def api_level_complete(request: Request, db: Session = Depends(get_db)):
 
     mode = (request.cookies.get("mode") or "research").lower()
     exporter.record_level(sess.participant, sess, lvl, mode=mode)
+    telemetry = body.get("telemetry")
+    if isinstance(telemetry, dict) and telemetry:
+        exporter.record_level_telemetry(sess.participant, sess, lvl, telemetry, mode=mode,
+                                        submitted_at=lvl.completed_at)
 
     all_levels = sorted(sess.levels, key=lambda x: x.index)
     remaining = [L for L in all_levels if not L.completed]
     return {"ok": True, "remaining": len(remaining)}
 
+def _clean_notes(notes: dict) -> dict[str, str]:
+    out = {}
+    for d in TLX_DIMS:
+        raw = notes.get(d, "")
+        out[d] = (raw if isinstance(raw, str) else str(raw)).strip()
+    return out
+
+def _validate_field(d: str, txt: str, participant_id: str, idx: int, offline: bool = False) -> dict:
+    passed, reason, source, quality = llm_tlx.validate_descriptive(d, "", txt,
+                               context={"participant": participant_id, "level_index": idx}, offline=offline)
+    return {"text": txt, "llm_valid": passed, "llm_reason": reason, "llm_source": source, "llm_quality": quality}
+
+def _assess_descriptive(texts: dict[str, str], participant_id: str, idx: int,
+                        offline: bool = False, cached: dict | None = None):
+    """
+    Validates all dimensions, reusing results already in `cached` (from
+    /api/tlx/validate). Rating is deferred to the job queue. Blocking (LLM calls).
+    """
+    cached = cached or {}
+    failed, validated = [], {}
+    for d in TLX_DIMS:
+        txt = texts[d]
+        if d in cached and not offline:
+            validated[d] = {"text": txt, **cached[d]}
+        else:
+            validated[d] = _validate_field(d, txt, participant_id, idx, offline)
+        if not validated[d]["llm_valid"]:
+            failed.append({"dimension": d, "reason": validated[d]["llm_reason"]})
+    return failed, validated
+
+def _fully_cached(cached: dict) -> bool:
+    return all(d in cached for d in TLX_DIMS)
+
+@app.post("/api/tlx/validate")
+async def api_tlx_validate(request: Request, db: Session = Depends(get_db)):
+    """
+    Speculative check of one descriptive field, called when it loses focus.
+    Body: { "index": 1..2, "dimension": str, "text": str }
+    """
+    sess = get_current_session(request, db)
+    if not sess:
+        raise HTTPException(status_code=401, detail="No active session.")
+    b = await request.json()
+    d = b.get("dimension")
+    if d not in TLX_DIMS:
+        raise HTTPException(status_code=400, detail="Invalid dimension.")
+    idx = int(b.get("index", 1))
+    txt = _clean_notes({d: b.get("text", "")})[d]
+
+    res = tlx_cache.lookup(db, {d: txt}).get(d)
+    if res is None:
+        pid = sess.participant_id
+        try:
+            async with admission.slot(pid, timeout=admission.SPECULATIVE_TIMEOUT_S):
+                res = await run_in_threadpool(_validate_field, d, txt, pid, idx)
+        except admission.Overloaded:
+            return {"ok": True, "dimension": d, "checked": False}
+        tlx_cache.store(db, d, txt, res)
+    return {"ok": True, "dimension": d, "checked": True, "passed": bool(res["llm_valid"]),
+            "reason": res["llm_reason"], "min_words": llm_tlx.MIN_WORDS}
+
 @app.post("/api/tlx/submit")
 async def api_tlx_submit(request: Request, db: Session = Depends(get_db)):
     """
@@ -366,38 +495,154 @@ async def api_tlx_submit(request: Request, db: Session = Depends(get_db)):
             if v < 1 or v > 7:
                 return JSONResponse({"ok": False, "failed": [{"dimension": d, "reason": "missing or out of range (1–7)"}]}, status_code=400)
             clean[d] = v
-        exporter.record_tlx_slider(sess.participant, sess, lvl, clean, mode=mode)
+        now = datetime.utcnow()
+        db.execute(insert(TlxSliderRating), [
+            {"participant_id": sess.participant_id, "session_id": sess.id, "level_id": lvl.id,
+             "level_index": lvl.index, "dimension": d, "rating": v, "submitted_at": now}
+            for d, v in clean.items()])
+        db.commit()
+        exporter.record_tlx_slider(sess.participant, sess, lvl, clean, mode=mode, submitted_at=now)
         return {"ok": True}
 
-    notes = b.get("notes") or {}
-    failed, validated = [], {}
-    for d in TLX_DIMS:
-        raw = notes.get(d, "")
-        txt = (raw if isinstance(raw, str) else str(raw)).strip()
-        passed, reason, source, quality = llm_tlx.validate_descriptive(d, "", txt,
-                                   context={"participant": sess.participant.id, "level_index": idx})
-        validated[d] = {"text": txt, "llm_valid": passed, "llm_reason": reason,
-                        "llm_source": source, "llm_quality": quality}
-        if not passed:
-            failed.append({"dimension": d, "reason": reason})
+    texts = _clean_notes(b.get("notes") or {})
+    pid = sess.participant_id
+    cached = tlx_cache.lookup(db, texts)
+    try:
+        if _fully_cached(cached):
+            failed, validated = _assess_descriptive(texts, pid, idx, cached=cached)
+        else:
+            async with admission.slot(pid):
+                failed, validated = await run_in_threadpool(_assess_descriptive, texts, pid, idx, False, cached)
+    except admission.Overloaded as e:
+        if admission.OVERLOAD == "reject":
+            return JSONResponse({"ok": False, "error": "busy", "retry_after": e.retry_after},
+                                status_code=429, headers={"Retry-After": str(e.retry_after)})
+        failed, validated = await run_in_threadpool(_assess_descriptive, texts, pid, idx, True)
+    _remember(db, texts, cached, validated)
     if failed:
         return JSONResponse({"ok": False, "failed": failed, "min_words": llm_tlx.MIN_WORDS}, status_code=400)
 
-    for d in TLX_DIMS:
-        txt = validated[d]["text"]
-        score, expl = llm_tlx.rate_descriptive(d, txt)
-        validated[d]["llm_likert"] = score
-        validated[d]["llm_explanation"] = expl
-
-    exporter.record_tlx_descriptive(sess.participant, sess, lvl, validated, mode=mode)
+    _save_descriptive(db, sess, lvl, validated, mode)
     return {"ok": True}
 
+def _remember(db, texts: dict, cached: dict, validated: dict):
+    for d, v in validated.items():
+        if d not in cached or (v.get("llm_likert") is not None and cached[d]["llm_likert"] is None):
+            tlx_cache.store(db, d, texts[d], v)
+
+def _save_descriptive(db, sess, lvl, validated: dict, mode: str):
+    """Stores the answers and queues a rating job for every dimension without a cached score."""
+    now = datetime.utcnow()
+    dims = list(validated)
+    ids = db.scalars(insert(TlxDescriptiveAnswer).returning(TlxDescriptiveAnswer.id, sort_by_parameter_order=True), [
+        {"participant_id": sess.participant_id, "session_id": sess.id, "level_id": lvl.id,
+         "level_index": lvl.index, "dimension": d, "submitted_at": now, **validated[d]}
+        for d in dims]).all()
+    jobs.enqueue(db, [i for d, i in zip(dims, ids) if validated[d].get("llm_likert") is None], mode)
+    db.commit()
+    jobs.wake()
+    exporter.record_tlx_descriptive(sess.participant, sess, lvl, validated, mode=mode, submitted_at=now)
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _assess_stream(texts: dict, pid: str, idx: int, cached: dict, validated: dict, failed: list):
+    """Same work as _assess_descriptive, but the six checks run concurrently and an
+    SSE frame is yielded as each one completes. Every LLM call takes its own
+    admission slot, so the provider never sees more than LLM_MAX_CONCURRENCY
+    calls per worker. A dimension that can't get a slot is checked offline, or
+    Overloaded is raised when LLM_OVERLOAD=reject."""
+    async def check(d):
+        if d in cached:
+            return d, {"text": texts[d], **cached[d]}
+        try:
+            async with admission.slot(pid):
+                call = asyncio.ensure_future(run_in_threadpool(_validate_field, d, texts[d], pid, idx))
+                try:
+                    return d, await asyncio.shield(call)
+                except asyncio.CancelledError:
+                    await asyncio.wait([call])   # the thread can't be stopped; keep the slot until it ends
+                    raise
+        except admission.Overloaded:
+            if admission.OVERLOAD == "reject":
+                raise
+        return d, await run_in_threadpool(_validate_field, d, texts[d], pid, idx, True)
+
+    tasks = [asyncio.ensure_future(check(d)) for d in TLX_DIMS]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            d, res = await fut
+            validated[d] = res
+            if not res["llm_valid"]:
+                failed.append({"dimension": d, "reason": res["llm_reason"]})
+            yield _sse("validated", {"dimension": d, "passed": bool(res["llm_valid"]), "reason": res["llm_reason"]})
+    finally:
+        for t in tasks:
+            t.cancel()
+
+@app.post("/api/tlx/submit/stream")
+async def api_tlx_submit_stream(request: Request, db: Session = Depends(get_db)):
+    """
+    Descriptive TLX submit as Server-Sent Events. Body: { "index": 1..2, "notes": {dim:str,..} }
+    Events:
+      validated {dimension, passed, reason}   as each dimension's check finishes
+      done      {ok, failed?, min_words?}     last event; answers are saved (and queued for rating) when ok
+      busy      {retry_after}                 no LLM slot and LLM_OVERLOAD=reject
+    """
+    sess = get_current_session(request, db)
+    if not sess:
+        raise HTTPException(status_code=401, detail="No active session.")
+    b = await request.json()
+    idx = int(b.get("index", 1))
+    lvl = db.query(Level).filter(Level.session_id == sess.id, Level.index == idx).first()
+    if not lvl:
+        raise HTTPException(status_code=400, detail="Level not found.")
+    mode = (request.cookies.get("mode") or "research").lower()
+    texts = _clean_notes(b.get("notes") or {})
+    pid = sess.participant_id
+    cached = tlx_cache.lookup(db, texts)
+
+    async def events():
+        validated, failed = {}, []
+        try:
+            async for frame in _assess_stream(texts, pid, idx, cached, validated, failed):
+                yield frame
+        except admission.Overloaded as e:
+            yield _sse("busy", {"retry_after": e.retry_after})
+            return
+        _remember(db, texts, cached, validated)
+        if failed:
+            yield _sse("done", {"ok": False, "failed": failed, "min_words": llm_tlx.MIN_WORDS})
+            return
+        _save_descriptive(db, sess, lvl, validated, mode)
+        yield _sse("done", {"ok": True})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/dashboard", dependencies=[Depends(require_admin)])
+def api_dashboard(mode: str = "research", db: Session = Depends(get_db)):
+    """Live study aggregates; reads only the pre-aggregated `aggregates` table."""
+    return {"ok": True, "mode": mode.lower(), "metrics": aggregates.snapshot(db, mode)}
+
+@app.get("/api/export.zip", dependencies=[Depends(require_admin)])
+def api_export_zip(mode: str = "all"):
+    """Streams an export snapshot as a ZIP, built from DB cursors while it downloads."""
+    mode = mode.lower()
+    if mode not in ("all", "research", "pilot"):
+        raise HTTPException(status_code=400, detail="mode must be all, research or pilot.")
+    name = f"snapshot_{mode}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(exporter.snapshot_zip(None if mode == "all" else mode),
+                             media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="{name}"',
+                                      "Cache-Control": "no-store"})
+
 @app.get("/post")
 def post_get(request: Request, db: Session = Depends(get_db)):
     sess = get_current_session(request, db)
     if not sess:
         return RedirectResponse("/", status_code=302)
-    return templates.TemplateResponse("post.html", {"request": request})
+    return get_templates().TemplateResponse("post.html", {"request": request})
 
 @app.post("/post")
 async def post_submit(request: Request, db: Session = Depends(get_db)):
@@ -413,9 +658,15 @@ async def post_submit(request: Request, db: Session = Depends(get_db)):
         "method_why": (form.get("method_why") or "").strip(),
     }
     mode = (request.cookies.get("mode") or "research").lower()
-    exporter.record_post_survey(sess.participant, sess, answers, mode=mode)
+    now = datetime.utcnow()
+    db.execute(insert(PostSurveyAnswer), [
+        {"participant_id": sess.participant_id, "session_id": sess.id,
+         "question_key": k, "response": v, "submitted_at": now}
+        for k, v in answers.items()])
+    db.commit()
+    exporter.record_post_survey(sess.participant, sess, answers, mode=mode, submitted_at=now)
     return RedirectResponse("/thank-you", status_code=303)
 
 @app.get("/thank-you")
 def thank_you(request: Request):
-    return templates.TemplateResponse("thankyou.html", {"request": request})
+    return get_templates().TemplateResponse("thankyou.html", {"request": request})
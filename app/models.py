@@ -1,7 +1,7 @@
 from __future__ import annotations
 import secrets
 from datetime import datetime
-from sqlalchemy import String, Integer, Boolean, DateTime, ForeignKey
+from sqlalchemy import String, Integer, Boolean, DateTime, Float, Text, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .db import Base
 
@@ -40,6 +40,7 @@ class Demographics(Base):
     age_band: Mapped[str] = mapped_column(String(40))
     gender: Mapped[str] = mapped_column(String(40))
     puzzle_experience: Mapped[str] = mapped_column(String(40))
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)   # NULL for rows from before the column
 
 class Level(Base):
     __tablename__ = "levels"
@@ -59,3 +60,94 @@ class Level(Base):
     time_ms: Mapped[int] = mapped_column(Integer, default=0)
 
 Session.levels = relationship("Level", back_populates="session", cascade="all, delete-orphan")
+
+# One row per (submission, dimension). Rows of the same submission share submitted_at.
+class TlxSliderRating(Base):
+    __tablename__ = "tlx_slider_ratings"
+    __table_args__ = (Index("ix_tlx_slider_session_level_dim", "session_id", "level_index", "dimension"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    participant_id: Mapped[str] = mapped_column(ForeignKey("participants.id"), index=True)
+    session_id: Mapped[str] = mapped_column(ForeignKey("sessions.id"))
+    level_id: Mapped[str] = mapped_column(ForeignKey("levels.id"))
+    level: Mapped["Level"] = relationship()
+    level_index: Mapped[int] = mapped_column(Integer)
+    dimension: Mapped[str] = mapped_column(String(40))
+    rating: Mapped[int] = mapped_column(Integer)
+    submitted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class TlxDescriptiveAnswer(Base):
+    __tablename__ = "tlx_descriptive_answers"
+    __table_args__ = (Index("ix_tlx_desc_session_level_dim", "session_id", "level_index", "dimension"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    participant_id: Mapped[str] = mapped_column(ForeignKey("participants.id"), index=True)
+    session_id: Mapped[str] = mapped_column(ForeignKey("sessions.id"))
+    level_id: Mapped[str] = mapped_column(ForeignKey("levels.id"))
+    level: Mapped["Level"] = relationship()
+    level_index: Mapped[int] = mapped_column(Integer)
+    dimension: Mapped[str] = mapped_column(String(40))
+    text: Mapped[str] = mapped_column(Text, default="")
+    llm_valid: Mapped[bool | None] = mapped_column(Boolean, nullable=True)
+    llm_reason: Mapped[str | None] = mapped_column(Text, nullable=True)
+    llm_source: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    llm_quality: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    llm_likert: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    llm_explanation: Mapped[str | None] = mapped_column(Text, nullable=True)
+    submitted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class PostSurveyAnswer(Base):
+    __tablename__ = "post_survey_answers"
+    __table_args__ = (Index("ix_post_survey_session_question", "session_id", "question_key"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    participant_id: Mapped[str] = mapped_column(ForeignKey("participants.id"), index=True)
+    session_id: Mapped[str] = mapped_column(ForeignKey("sessions.id"))
+    question_key: Mapped[str] = mapped_column(String(60))
+    response: Mapped[str] = mapped_column(Text, default="")
+    submitted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class Aggregate(Base):
+    """Running count/mean/M2 (Welford) for one (mode, metric, key) cell of the live dashboard."""
+    __tablename__ = "aggregates"
+    __table_args__ = (UniqueConstraint("mode", "metric", "key", name="uq_aggregate_cell"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    mode: Mapped[str] = mapped_column(String(20))
+    metric: Mapped[str] = mapped_column(String(40))
+    key: Mapped[str] = mapped_column(String(120))
+    n: Mapped[int] = mapped_column(Integer, default=0)
+    mean: Mapped[float] = mapped_column(Float, default=0.0)
+    m2: Mapped[float] = mapped_column(Float, default=0.0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class TlxValidationCache(Base):
+    """LLM verdict (and rating, once done) for one (dimension, sha256 of text); shared by all workers."""
+    __tablename__ = "tlx_validation_cache"
+    __table_args__ = (UniqueConstraint("dimension", "text_hash", name="uq_tlx_validation"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    dimension: Mapped[str] = mapped_column(String(40))
+    text_hash: Mapped[str] = mapped_column(String(64))
+    llm_valid: Mapped[bool] = mapped_column(Boolean)
+    llm_reason: Mapped[str] = mapped_column(Text, default="")
+    llm_source: Mapped[str] = mapped_column(String(20))
+    llm_quality: Mapped[str] = mapped_column(String(20))
+    llm_likert: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    llm_explanation: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class RatingJob(Base):
+    """Deferred rate_descriptive call for one TlxDescriptiveAnswer (see services/jobs.py)."""
+    __tablename__ = "rating_jobs"
+    __table_args__ = (Index("ix_rating_jobs_status_run_after", "status", "run_after"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    answer_id: Mapped[int] = mapped_column(ForeignKey("tlx_descriptive_answers.id"), unique=True)
+    answer: Mapped["TlxDescriptiveAnswer"] = relationship()
+    mode: Mapped[str] = mapped_column(String(20), default="research")
+    status: Mapped[str] = mapped_column(String(10), default="pending")  # pending|running|done|failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    run_after: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+Participant.tlx_slider_ratings = relationship("TlxSliderRating", viewonly=True, order_by=TlxSliderRating.id)
+Participant.tlx_descriptive_answers = relationship("TlxDescriptiveAnswer", viewonly=True, order_by=TlxDescriptiveAnswer.id)
+Participant.post_survey_answers = relationship("PostSurveyAnswer", viewonly=True, order_by=PostSurveyAnswer.id)
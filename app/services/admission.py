@@ -0,0 +1,115 @@
+from __future__ import annotations
+import os, math, time, asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from . import metrics
+
+# Admission control for LLM-backed work. At most LLM_MAX_CONCURRENCY submissions
+# talk to the provider at once (per worker process); the rest wait in a queue
+# that is served round-robin across participants, so one participant resubmitting
+# can't starve the others. A waiter that isn't admitted within LLM_QUEUE_TIMEOUT_S
+# gets Overloaded, and the caller either degrades to the offline heuristics
+# (LLM_OVERLOAD=offline, default) or answers 429 (LLM_OVERLOAD=reject).
+MAX_CONCURRENCY = max(1, int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+QUEUE_TIMEOUT_S = float(os.getenv("LLM_QUEUE_TIMEOUT_S", "15"))
+OVERLOAD = os.getenv("LLM_OVERLOAD", "offline").strip().lower()
+# Speculative per-field checks give up quickly: they are the first work to shed.
+SPECULATIVE_TIMEOUT_S = float(os.getenv("LLM_SPECULATIVE_TIMEOUT_S", "2"))
+
+QUEUE_DEPTH = metrics.Gauge("llm_admission_queue_depth", "Submissions waiting for an LLM slot.")
+IN_FLIGHT = metrics.Gauge("llm_admission_in_flight", "Submissions holding an LLM slot.")
+QUEUE_WAIT = metrics.Histogram("llm_admission_wait_seconds", "Time spent queued for an LLM slot.", ["outcome"])
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM queue full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class FairLimiter:
+    """
+    Bounded concurrency with per-owner FIFO queues served round-robin. Only
+    touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self.hold_s = 2.0   # EWMA of slot hold time, for Retry-After
+        self._queues: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+
+    def _publish(self):
+        QUEUE_DEPTH.set(self.waiting)
+        IN_FLIGHT.set(self.active)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.hold_s * (self.waiting + 1) / self.limit))
+
+    async def acquire(self, owner: str, timeout: float):
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            self._publish()
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(owner, deque()).append(fut)
+        self.waiting += 1
+        self._publish()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                self.release()  # admitted while timing out: pass the slot on
+            else:
+                fut.cancel()
+                self._discard(owner, fut)
+            raise
+
+    def _discard(self, owner: str, fut: asyncio.Future):
+        q = self._queues.get(owner)
+        if q is not None and fut in q:
+            q.remove(fut)
+            self.waiting -= 1
+            if not q:
+                del self._queues[owner]
+        self._publish()
+
+    def release(self, held_s: float | None = None):
+        if held_s is not None:
+            self.hold_s = 0.8 * self.hold_s + 0.2 * held_s
+        # Hand the slot straight to the next owner in the ring (active stays the same).
+        while self._queues:
+            owner, q = next(iter(self._queues.items()))
+            fut = q.popleft()
+            self.waiting -= 1
+            if q:
+                self._queues.move_to_end(owner)
+            else:
+                del self._queues[owner]
+            if not fut.done():
+                fut.set_result(None)
+                self._publish()
+                return
+        self.active -= 1
+        self._publish()
+
+
+_limiter = FairLimiter(MAX_CONCURRENCY)
+
+@asynccontextmanager
+async def slot(owner: str, timeout: float = QUEUE_TIMEOUT_S):
+    """`async with admission.slot(participant_id):` -> raises Overloaded after `timeout` in the queue."""
+    t0 = time.perf_counter()
+    try:
+        await _limiter.acquire(owner, timeout)
+    except asyncio.TimeoutError:
+        QUEUE_WAIT.observe(time.perf_counter() - t0, outcome="timeout")
+        raise Overloaded(_limiter.retry_after()) from None
+    t1 = time.perf_counter()
+    QUEUE_WAIT.observe(t1 - t0, outcome="admitted")
+    try:
+        yield
+    finally:
+        _limiter.release(time.perf_counter() - t1)
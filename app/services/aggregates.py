@@ -0,0 +1,67 @@
+from __future__ import annotations
+import math, logging
+from datetime import datetime
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+
+log = logging.getLogger("aggregates")
+
+# Metric names (key format in brackets):
+#   level_completed  [difficulty|condition]  1.0 solved / 0.0 quit -> mean is the completion rate
+#   level_time_ms    [difficulty]            solved levels only
+#   level_moves      [difficulty]            solved levels only
+#   sequence         [A|B]                   n is the number of sessions assigned to each sequence
+#   tlx_slider       [condition|dimension]   slider rating 1..7
+#   tlx_llm          [condition|dimension]   llm_likert from rate_descriptive
+
+
+def _welford_update(Aggregate, x: float):
+    # One UPDATE statement: every right-hand side sees the pre-update row, so
+    # new_mean = mean + (x - mean) / (n + 1) and m2 += (x - mean) * (x - new_mean).
+    new_mean = Aggregate.mean + (x - Aggregate.mean) / (Aggregate.n + 1)
+    return {"n": Aggregate.n + 1, "mean": new_mean,
+            "m2": Aggregate.m2 + (x - Aggregate.mean) * (x - new_mean),
+            "updated_at": datetime.utcnow()}
+
+def observe_many(mode: str, values: list[tuple[str, str, float]]):
+    """Folds [(metric, key, x), ...] into the running aggregates in one transaction; O(1) per value."""
+    if not values:
+        return
+    from ..db import engine
+    from ..models import Aggregate
+
+    mode = (mode or "research").lower()
+    try:
+        with engine.begin() as conn:
+            for metric, key, x in values:
+                x = float(x)
+                cell = ((Aggregate.mode == mode) & (Aggregate.metric == metric) & (Aggregate.key == key))
+                if conn.execute(update(Aggregate).where(cell).values(**_welford_update(Aggregate, x))).rowcount:
+                    continue
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(Aggregate).values(mode=mode, metric=metric, key=key, n=1, mean=x,
+                                                              m2=0.0, updated_at=datetime.utcnow()))
+                except IntegrityError:
+                    # Another worker created the cell first.
+                    conn.execute(update(Aggregate).where(cell).values(**_welford_update(Aggregate, x)))
+    except Exception as e:
+        log.warning("aggregate update failed (%s): %s", mode, e)
+
+def observe(mode: str, metric: str, key: str, x: float):
+    observe_many(mode, [(metric, key, x)])
+
+
+def snapshot(db, mode: str) -> dict:
+    """Read-only view for the dashboard: {metric: {key: {n, mean, sd}}} from the aggregates table only."""
+    from ..models import Aggregate
+
+    out: dict = {}
+    rows = db.execute(select(Aggregate.metric, Aggregate.key, Aggregate.n, Aggregate.mean, Aggregate.m2)
+                      .where(Aggregate.mode == (mode or "research").lower())).all()
+    for metric, key, n, mean, m2 in rows:
+        sd = math.sqrt(m2 / (n - 1)) if n > 1 else None
+        out.setdefault(metric, {})[key] = {"n": n, "mean": round(mean, 4),
+                                           "sd": (round(sd, 4) if sd is not None else None)}
+    return out
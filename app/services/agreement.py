@@ -0,0 +1,176 @@
+from __future__ import annotations
+import csv, os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from . import exporter
+
+# Slider ratings vs llm_likert from rate_descriptive, joined on
+# (participant_id, level_index, dimension). Both are 1..7, but for Performance
+# the slider puts high success at 7 and the rater at 1 (see llm_tlx), so those
+# LLM scores are mirrored (8 - score) onto the slider's scale before comparing.
+K = 7
+LLM_INVERTED = {"Performance"}
+METRICS = ("kappa_w", "icc", "mae", "spearman")
+BOOT_BLOCK = 5000   # resamples materialized at once per worker task
+MAX_DROPPED = 0.01  # non-finite resamples tolerated before a CI is reported as NaN
+ALL = "all"
+
+
+def load_pairs(base: Path) -> list[dict]:
+    """
+    Joined rows {participant_id, level_index, condition, dimension, slider, llm},
+    llm on the slider's scale; the latest submission wins.
+    """
+    slider: dict[tuple, tuple[str, int]] = {}
+    with (base / "tlx_slider.csv").open(newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            for dim in exporter.TLX_DIMS:
+                v = (row.get(dim) or "").strip()
+                if v:
+                    slider[(row["participant_id"], row["level_index"], dim)] = (row.get("condition", ""), int(v))
+    llm: dict[tuple, int] = {}
+    with (base / "tlx_descriptive_long.csv").open(newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            v = (row.get("llm_likert") or "").strip()
+            if v:
+                score = int(float(v))
+                if row["dimension"] in LLM_INVERTED:
+                    score = K + 1 - score
+                llm[(row["participant_id"], row["level_index"], row["dimension"])] = score
+    out = []
+    for key, (cond, s) in slider.items():
+        if key in llm:
+            out.append({"participant_id": key[0], "level_index": key[1], "dimension": key[2],
+                        "condition": cond, "slider": s, "llm": llm[key]})
+    return out
+
+
+def confusion(a, b) -> np.ndarray:
+    """(K, K) counts of (slider, llm) rating pairs."""
+    a = np.asarray(a, dtype=np.int64) - 1
+    b = np.asarray(b, dtype=np.int64) - 1
+    return np.bincount(a * K + b, minlength=K * K).reshape(K, K).astype(float)
+
+def batch_metrics(C: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    C: (B, K, K) pair counts, one confusion matrix per (re)sample. Ratings are
+    discrete, so every statistic is a closed form in the cell proportions and
+    costs O(K^2) per sample regardless of n. Returns (B,) arrays:
+      kappa_w  quadratic-weighted Cohen's kappa = 2*s_ab / (s_a^2 + s_b^2 + (mean_a - mean_b)^2)
+      icc      ICC(A,1): two-way, absolute agreement, single rater (McGraw & Wong)
+      mae      mean absolute difference
+      spearman Spearman rho (Pearson on tie-averaged ranks)
+    Undefined values (e.g. zero variance) come back as NaN.
+    """
+    C = np.asarray(C, dtype=float)
+    v = np.arange(1, K + 1, dtype=float)
+    n = C.sum(axis=(1, 2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = C / n[:, None, None]
+        pa, pb = p.sum(axis=2), p.sum(axis=1)
+        ma, mb = pa @ v, pb @ v
+        va, vb = pa @ v**2 - ma**2, pb @ v**2 - mb**2
+        cov = np.einsum("bij,i,j->b", p, v, v) - ma * mb
+        kappa = 2.0 * cov / (va + vb + (ma - mb) ** 2)
+
+        # Two raters: subject means r = (a+b)/2, residuals are +/-(d - mean d)/2 with d = a-b.
+        msr = n * (va + vb + 2.0 * cov) / 2.0 / (n - 1)
+        msc = n * (ma - mb) ** 2 / 2.0
+        mse = n * (va + vb - 2.0 * cov) / 2.0 / (n - 1)
+        icc = (msr - mse) / (msr + mse + 2.0 * (msc - mse) / n)
+
+        mae = np.einsum("bij,ij->b", p, np.abs(v[:, None] - v[None, :]))
+
+        def ranks(marg):
+            cnt = marg * n[:, None]
+            return np.cumsum(cnt, axis=1) - cnt + (cnt + 1.0) / 2.0
+        ra, rb = ranks(pa), ranks(pb)
+        mra, mrb = (pa * ra).sum(axis=1), (pb * rb).sum(axis=1)
+        cov_r = np.einsum("bij,bi,bj->b", p, ra, rb) - mra * mrb
+        rho = cov_r / np.sqrt(((pa * ra**2).sum(axis=1) - mra**2) * ((pb * rb**2).sum(axis=1) - mrb**2))
+    return {"kappa_w": kappa, "icc": icc, "mae": mae, "spearman": rho}
+
+
+def _boot_task(P: np.ndarray, n_boot: int, seed) -> dict[str, np.ndarray]:
+    # P: (m, K, K), one confusion matrix per participant. Resampling m participants
+    # with replacement == one multinomial draw of per-participant weights, and the
+    # resample's counts are those weights times P.
+    rng = np.random.default_rng(seed)
+    n_p = P.shape[0]
+    flat = P.reshape(n_p, K * K)
+    parts = {m: [] for m in METRICS}
+    for start in range(0, n_boot, BOOT_BLOCK):
+        weights = rng.multinomial(n_p, np.full(n_p, 1.0 / n_p), size=min(BOOT_BLOCK, n_boot - start))
+        res = batch_metrics((weights @ flat).reshape(-1, K, K))
+        for m in METRICS:
+            parts[m].append(res[m])
+    return {m: np.concatenate(v) for m, v in parts.items()}
+
+def _groups(pairs: list[dict]) -> dict[tuple[str, str], np.ndarray]:
+    """(dimension, condition) -> (participants, K, K) per-participant confusion matrices."""
+    cells: dict[tuple[str, str], dict[str, list[tuple[int, int]]]] = {}
+    for r in pairs:
+        for key in ((r["dimension"], r["condition"]), (r["dimension"], ALL), (ALL, r["condition"]), (ALL, ALL)):
+            cells.setdefault(key, {}).setdefault(r["participant_id"], []).append((r["slider"], r["llm"]))
+    return {k: np.stack([confusion([s for s, _ in rows], [l for _, l in rows]) for rows in v.values()])
+            for k, v in sorted(cells.items())}
+
+def analyze(pairs: list[dict], n_boot: int = 10_000, workers: int | None = None,
+            seed: int = 0, alpha: float = 0.05) -> list[dict]:
+    """
+    Point estimates and percentile bootstrap CIs per (dimension, condition),
+    including 'all' margins. Each cell's resamples are split into one task per
+    worker, each with an independent child seed, and run on a process pool.
+    Participants are resampled (cluster bootstrap): the margins pool several
+    correlated rows per participant, so resampling rows would understate their
+    CIs. In a dimension x condition cell each participant has one row, so this
+    is the ordinary row bootstrap there. A resample can be degenerate (e.g.
+    every weight on raters with no spread, leaving spearman undefined); such
+    resamples are counted in {metric}_dropped, and if they exceed MAX_DROPPED
+    of the total the CI is NaN rather than a percentile of the survivors.
+    """
+    groups = _groups(pairs)
+    workers = workers or os.cpu_count() or 1
+    per_task = max(1, -(-n_boot // workers)) if n_boot else 0
+    seeds = iter(np.random.SeedSequence(seed).spawn(len(groups) * workers))
+
+    tasks = []
+    for key, P in groups.items():
+        left = n_boot
+        while left > 0:
+            tasks.append((key, P, min(per_task, left), next(seeds)))
+            left -= per_task
+
+    boot: dict[tuple, dict[str, list]] = {k: {m: [] for m in METRICS} for k in groups}
+    if tasks and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futs = [(t[0], pool.submit(_boot_task, *t[1:])) for t in tasks]
+            results = [(k, f.result()) for k, f in futs]
+    else:
+        results = [(t[0], _boot_task(*t[1:])) for t in tasks]
+    for key, res in results:
+        for m in METRICS:
+            boot[key][m].append(res[m])
+
+    out = []
+    lo_q, hi_q = 100 * alpha / 2, 100 * (1 - alpha / 2)
+    for key, P in groups.items():
+        C = P.sum(axis=0)
+        point = batch_metrics(C[None])
+        row = {"dimension": key[0], "condition": key[1], "n": int(C.sum()), "participants": P.shape[0]}
+        for m in METRICS:
+            row[m] = float(point[m][0])
+            samples = np.concatenate(boot[key][m]) if boot[key][m] else np.array([])
+            ok = samples[np.isfinite(samples)]
+            dropped = samples.size - ok.size
+            row[f"{m}_lo"], row[f"{m}_hi"] = ((float(np.percentile(ok, lo_q)), float(np.percentile(ok, hi_q)))
+                                              if ok.size and dropped <= MAX_DROPPED * samples.size
+                                              else (float("nan"), float("nan")))
+            row[f"{m}_dropped"] = dropped
+        out.append(row)
+    return out
+
+REPORT_HEADERS = ["dimension", "condition", "n", "participants"] + [f"{m}{s}" for m in METRICS for s in ("", "_lo", "_hi", "_dropped")]
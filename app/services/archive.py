@@ -0,0 +1,173 @@
+from __future__ import annotations
+import io, os, json, time, shutil, tempfile, threading
+from dataclasses import dataclass
+from pathlib import Path
+
+try:
+    import zstandard as zstd  # optional: `pip install zstandard` to archive / read archived participants
+except ImportError:
+    zstd = None
+
+from . import exporter
+
+# Shard archive layout (by_participant/<shard>.zpack):
+#
+#   [zstd frame][zstd frame]...[index JSON][u64 LE index length][MAGIC]
+#
+# Every file is its own zstd frame, so one participant's file is read with a
+# single seek + decompress of that frame. The index maps
+# "<shard>/<label>" -> {file name: [offset, compressed length, size]}.
+# Adding participants to an existing archive copies the old frames verbatim.
+MAGIC = b"NTNZPK01"
+EXT = ".zpack"
+LEVEL = 19
+_TRAILER = 8 + len(MAGIC)
+
+_index_cache: dict[str, tuple[tuple[int, int], dict]] = {}
+_cache_lock = threading.Lock()
+
+
+def _require():
+    if zstd is None:
+        raise RuntimeError("zstandard is not installed (pip install zstandard)")
+
+def archive_path(base: Path, shard: str) -> Path:
+    return base / "by_participant" / f"{shard}{EXT}"
+
+def read_index(path: Path) -> dict[str, dict[str, list[int]]]:
+    st = path.stat()
+    sig = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        hit = _index_cache.get(str(path))
+        if hit and hit[0] == sig:
+            return hit[1]
+    with path.open("rb") as f:
+        f.seek(-_TRAILER, os.SEEK_END)
+        tail = f.read(_TRAILER)
+        if tail[8:] != MAGIC:
+            raise ValueError(f"{path} is not a participant archive")
+        n = int.from_bytes(tail[:8], "little")
+        f.seek(-_TRAILER - n, os.SEEK_END)
+        idx = json.loads(f.read(n))
+    with _cache_lock:
+        _index_cache[str(path)] = (sig, idx)
+    return idx
+
+def read_member(path: Path, folder: str, name: str) -> bytes | None:
+    _require()
+    entry = read_index(path).get(folder, {}).get(name)
+    if entry is None:
+        return None
+    off, length, size = entry
+    with path.open("rb") as f:
+        f.seek(off)
+        return zstd.ZstdDecompressor().decompress(f.read(length), max_output_size=size)
+
+
+@dataclass(frozen=True)
+class ArchiveMember:
+    """Path-like handle to one archived file (enough of the Path API for the CSV readers)."""
+    archive: str
+    folder: str
+    name: str
+
+    def is_file(self) -> bool:
+        return True
+
+    def read_bytes(self) -> bytes:
+        return read_member(Path(self.archive), self.folder, self.name) or b""
+
+    def open(self, mode: str = "r", newline: str | None = None, encoding: str = "utf-8"):
+        return io.StringIO(self.read_bytes().decode(encoding), newline=newline)
+
+def extract(path: Path, folder: str, dest: Path) -> int:
+    """Writes every file of `folder` from the archive into `dest` (atomic per file)."""
+    dest.mkdir(parents=True, exist_ok=True)
+    names = read_index(path).get(folder, {})
+    for name in names:
+        tmp = dest / f".{name}.restore"
+        tmp.write_bytes(read_member(path, folder, name))
+        os.replace(tmp, dest / name)
+    return len(names)
+
+
+def pack(path: Path, folders: dict[str, Path]) -> int:
+    """
+    Writes/extends the archive at `path` with `folders` ({rel: directory}).
+    Entries already in the archive for the same rel are replaced. Returns the
+    archive size in bytes.
+    """
+    _require()
+    old = read_index(path) if path.exists() else {}
+    cctx = zstd.ZstdCompressor(level=LEVEL, write_content_size=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            idx: dict[str, dict[str, list[int]]] = {}
+            if old:
+                with path.open("rb") as src:
+                    for rel, files in old.items():
+                        if rel in folders:
+                            continue
+                        idx[rel] = {}
+                        for name, (off, length, size) in files.items():
+                            src.seek(off)
+                            idx[rel][name] = [out.tell(), length, size]
+                            out.write(src.read(length))
+            for rel, d in sorted(folders.items()):
+                idx[rel] = {}
+                for f in sorted(x for x in d.iterdir() if x.is_file() and not x.name.startswith(".")):
+                    data = f.read_bytes()
+                    frame = cctx.compress(data)
+                    idx[rel][f.name] = [out.tell(), len(frame), len(data)]
+                    out.write(frame)
+            raw = json.dumps(idx, separators=(",", ":"), sort_keys=True).encode("utf-8")
+            out.write(raw + len(raw).to_bytes(8, "little") + MAGIC)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, path)
+        return path.stat().st_size
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _completed(folder: Path, cutoff: float) -> bool:
+    # Finished = post-survey submitted and nothing written for the idle period.
+    if not (folder / "post_survey.csv").is_file():
+        return False
+    return max(f.stat().st_mtime for f in folder.iterdir()) < cutoff
+
+def archive_completed(base: Path, min_idle_s: float = 86400, dry_run: bool = False) -> dict:
+    """
+    Packs completed participant folders of `base` into per-shard archives,
+    points their index entries at the archive and removes the folders.
+    """
+    _require()
+    root = base / "by_participant"
+    cutoff = time.time() - min_idle_s
+    by_shard: dict[str, dict[str, tuple[str, Path]]] = {}
+    for pid, rel in exporter.indexed_participants(base).items():
+        folder = root / rel
+        if folder.is_dir() and _completed(folder, cutoff):
+            by_shard.setdefault(rel.split("/", 1)[0], {})[rel] = (pid, folder)
+
+    stats = {"participants": 0, "shards": 0, "bytes_in": 0, "bytes_out": 0}
+    for shard, members in sorted(by_shard.items()):
+        stats["participants"] += len(members)
+        stats["shards"] += 1
+        stats["bytes_in"] += sum(f.stat().st_size for _, d in members.values() for f in d.iterdir() if f.is_file())
+        if dry_run:
+            continue
+        path = archive_path(base, shard)
+        before = path.stat().st_size if path.exists() else 0
+        stats["bytes_out"] += pack(path, {rel: d for rel, (_, d) in members.items()}) - before
+        # Index first, then delete: a crash in between leaves the folder, which still wins.
+        for rel, (pid, _) in members.items():
+            exporter.mark_archived(base, pid, path.relative_to(root).as_posix())
+        for _, d in members.values():
+            shutil.rmtree(d)
+        shard_dir = root / shard
+        if shard_dir.is_dir() and not any(shard_dir.iterdir()):
+            shard_dir.rmdir()
+    return stats
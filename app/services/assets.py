@@ -0,0 +1,144 @@
+from __future__ import annotations
+import os, gzip, json, hashlib, mimetypes, stat, tempfile
+from pathlib import Path
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli  # optional: `pip install brotli` to also emit .br variants
+except ImportError:
+    brotli = None
+
+from . import locks
+
+STATIC_DIR = Path(__file__).resolve().parents[2] / "static"
+DIST = "dist"
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".build.lock"
+HASH_LEN = 12
+COMPRESSIBLE = {".js", ".css", ".svg", ".json", ".html", ".txt", ".map"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_manifest: dict[str, str] | None = None
+
+
+def _hashed_name(rel: Path, digest: str) -> Path:
+    return rel.with_name(f"{rel.stem}.{digest[:HASH_LEN]}{rel.suffix}")
+
+def _write_if_changed(path: Path, data: bytes):
+    if path.exists() and path.stat().st_size == len(data) and path.read_bytes() == data:
+        return
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)   # mkstemp creates 0600
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+def build(static_dir: Path = STATIC_DIR) -> dict[str, str]:
+    """
+    Copy every asset under static/ to static/dist/ with a content hash in its name,
+    write .gz (and .br when brotli is installed) next to compressible ones, drop
+    stale outputs, and return/persist the logical-path -> hashed-path manifest.
+    Safe to run from several processes at once (serialized by a lock file).
+    """
+    dist = static_dir / DIST
+    dist.mkdir(parents=True, exist_ok=True)
+    # Every worker builds in its lifespan; one at a time, the rest find it done.
+    with locks.file_lock(dist / LOCK_NAME):
+        return _build(static_dir, dist)
+
+def _build(static_dir: Path, dist: Path) -> dict[str, str]:
+    global _manifest
+    manifest, keep = {}, {dist / MANIFEST_NAME}
+    for src in sorted(static_dir.rglob("*")):
+        if not src.is_file() or dist in src.parents:
+            continue
+        rel = src.relative_to(static_dir)
+        data = src.read_bytes()
+        out = dist / _hashed_name(rel, hashlib.sha256(data).hexdigest())
+        out.parent.mkdir(parents=True, exist_ok=True)
+        _write_if_changed(out, data)
+        keep.add(out)
+        if src.suffix in COMPRESSIBLE:
+            gz = out.with_name(out.name + ".gz")
+            if not gz.exists():
+                _write_if_changed(gz, gzip.compress(data, compresslevel=9, mtime=0))
+            keep.add(gz)
+            if brotli is not None:
+                br = out.with_name(out.name + ".br")
+                if not br.exists():
+                    _write_if_changed(br, brotli.compress(data, quality=11))
+                keep.add(br)
+        manifest[rel.as_posix()] = f"{DIST}/{out.relative_to(dist).as_posix()}"
+    for f in dist.rglob("*"):
+        # Dotfiles are the lock and in-flight temp files.
+        if f.is_file() and f not in keep and not f.name.startswith("."):
+            f.unlink(missing_ok=True)
+    _write_if_changed(dist / MANIFEST_NAME, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    _manifest = manifest
+    return manifest
+
+def _load_manifest() -> dict[str, str]:
+    global _manifest
+    if _manifest is None:
+        try:
+            _manifest = json.loads((STATIC_DIR / DIST / MANIFEST_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+def asset_url(path: str) -> str:
+    """Jinja helper: {{ asset_url('js/game.js') }} -> /static/dist/js/game.<hash>.js"""
+    path = path.lstrip("/")
+    return "/static/" + _load_manifest().get(path, path)
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    out = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in {"q=0", "q=0.0", "q=0.00", "q=0.000"}:
+            continue
+        out.add(name.strip().lower())
+    return out
+
+
+class AssetStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves fingerprinted dist/ files with immutable caching and
+    precompressed br/gzip variants; unhashed paths keep revalidation semantics.
+    """
+
+    async def get_response(self, path: str, scope):
+        path = path.replace(os.sep, "/")
+        if not path.startswith(DIST + "/") or path == f"{DIST}/{MANIFEST_NAME}":
+            resp = await super().get_response(path, scope)
+            resp.headers.setdefault("cache-control", "no-cache")
+            return resp
+
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        resp = None
+        for enc, ext in (("br", ".br"), ("gzip", ".gz")):
+            if enc not in accepted:
+                continue
+            full, st = await anyio.to_thread.run_sync(self.lookup_path, path + ext)
+            if st and stat.S_ISREG(st.st_mode):
+                resp = self.file_response(full, st, scope)
+                if resp.status_code == 200:
+                    media = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                    if media.startswith("text/") or media.endswith(("javascript", "json")):
+                        media += "; charset=utf-8"
+                    resp.headers["content-type"] = media
+                    resp.headers["content-encoding"] = enc
+                break
+        if resp is None:
+            resp = await super().get_response(path, scope)
+        resp.headers["cache-control"] = IMMUTABLE
+        resp.headers["vary"] = "Accept-Encoding"
+        return resp
@@ -1,12 +1,58 @@
 from __future__ import annotations
-import os, csv
+import os, csv, time, json, math, hashlib, shutil, threading
 from pathlib import Path
 from datetime import datetime
 import re
 
+from . import metrics, tracing, aggregates
+
 
 BASE_DIR = Path(os.getenv("DATA_DIR", "./data"))
 
+TLX_DIMS = ["Mental Demand","Physical Demand","Temporal Demand","Performance","Effort","Frustration"]
+
+PARTICIPANT_HEADERS = ["participant_no","participant_id","created_at","name","email","consent"]
+DEMOGRAPHICS_HEADERS = ["participant_no","participant_id","age_band","gender","puzzle_experience","updated_at"]
+LEVEL_HEADERS = ["participant_no","participant_id","session_id","level_index","condition","difficulty","shuffle_steps",
+                 "started_at","completed_at","completed","moves","time_ms"]
+TLX_SLIDER_HEADERS = ["participant_no","participant_id","session_id","level_index",
+                      "condition","difficulty","tlx_type","ts"] + TLX_DIMS
+TLX_WIDE_HEADERS = ["participant_no","participant_id","session_id","level_index",
+                    "condition","difficulty","tlx_type","ts"] + [f"{d}__text" for d in TLX_DIMS]
+TLX_LONG_HEADERS = ["participant_no","participant_id","session_id","level_index","condition",
+                    "difficulty","tlx_type","dimension","text",
+                    "llm_valid","llm_reason","llm_source","llm_quality",
+                    "llm_likert","llm_explanation","ts"]
+
+# Map post-survey form keys -> human-readable question text
+POST_QUESTIONS = {
+    "method_natural": "Which method felt more natural to describe your workload?",
+    "method_nuance": "Which captured nuances or context better?",
+    "summarization_fairness_text": "If descriptive answers are summarized into 1–7 later, how fair/accurate would that feel?",
+    "method_why": "Briefly, which method did you prefer over the other and why?",
+}
+POST_WIDE_HEADERS = ["participant_no","participant_id","session_id","ts"] + list(POST_QUESTIONS.keys())
+POST_LONG_HEADERS = ["participant_no","participant_id","session_id","ts","question_key","question","response"]
+# Client-side rendering telemetry per level (see Telemetry in static/js/game.js); ms unless noted.
+TELEMETRY_FIELDS = ["frames","frame_ms_p50","frame_ms_p95","frame_ms_max","long_frames",
+                    "inputs","input_ms_p50","input_ms_p95","input_ms_max",
+                    "bench_full_ms","bench_dirty_ms","dpr"]
+LEVEL_TELEMETRY_HEADERS = ["participant_no","participant_id","session_id","level_index",
+                           "condition","difficulty","ts"] + TELEMETRY_FIELDS
+
+# Aggregate file -> (per-participant file, column the rows are appended in order of)
+AGGREGATE_FILES = {
+    "participants.csv":         ("info.csv",                 "created_at"),
+    "demographics.csv":         ("demographics.csv",         "updated_at"),
+    "levels.csv":               ("levels.csv",               "completed_at"),
+    "tlx_slider.csv":           ("tlx_slider.csv",           "ts"),
+    "tlx_descriptive_wide.csv": ("tlx_descriptive_wide.csv", "ts"),
+    "tlx_descriptive_long.csv": ("tlx_descriptive_long.csv", "ts"),
+    "post_survey.csv":          ("post_survey.csv",          "ts"),
+    "post_survey_long.csv":     ("post_survey_long.csv",     "ts"),
+    "level_telemetry.csv":      ("level_telemetry.csv",      "ts"),
+}
+
 def _slug_name(name: str) -> str:
     s = (name or "").strip().lower()
     s = re.sub(r'[^a-z0-9]+', '-', s).strip('-')
@@ -31,24 +77,198 @@ def _ensure_base(base: Path):
 def _iso(dt):
     return dt.isoformat(timespec="seconds") if dt else ""
 
+@tracing.traced("exporter.write", key=0)
 def _write_row(path: Path, fieldnames: list[str], row: dict):
+    t0 = time.perf_counter()
     path.parent.mkdir(parents=True, exist_ok=True)
     new = not path.exists()
     with path.open("a", newline="", encoding="utf-8") as f:
+        start = f.tell()
         w = csv.DictWriter(f, fieldnames=fieldnames)
         if new:
             w.writeheader()
         w.writerow(row)
+        written = f.tell() - start
+    metrics.EXPORT_WRITE.observe(time.perf_counter() - t0, file=path.name)
+    metrics.EXPORT_BYTES.observe(written, file=path.name)
+
+# --- Sharded per-participant layout ---
+# by_participant/<shard>/<label>/ where <shard> is a participant_no range
+# ("0000-0099") or, for unnumbered (pilot) participants, a hash bucket ("na_3f").
+# by_participant/index.jsonl maps participant_id -> folder so that the label is
+# computed once per participant; every worker tails the same append-only file.
+# Later {"archive": ...} entries record that a folder was packed into a shard
+# archive (services/archive.py); a folder that exists on disk always wins.
+SHARD_SIZE = 100
+INDEX_NAME = "index.jsonl"
+_SHARD_RE = re.compile(r"^(\d{4,}-\d{4,}|na_[0-9a-f]{2})$")
+
+_index_lock = threading.Lock()
+_index: dict[Path, dict] = {}     # base -> {"offset": int, "map": {participant_id: rel_folder},
+                                  #          "archived": {rel_folder: rel_archive}}
+
+def _shard_for(participant_id: str, participant_no) -> str:
+    if participant_no is None:
+        return "na_" + hashlib.sha1(str(participant_id).encode("utf-8")).hexdigest()[:2]
+    lo = (int(participant_no) // SHARD_SIZE) * SHARD_SIZE
+    return f"{lo:04d}-{lo + SHARD_SIZE - 1:04d}"
+
+def _index_state(base: Path) -> dict:
+    """Loads any index lines appended since the last read (by this or another worker)."""
+    st = _index.setdefault(base, {"offset": 0, "map": {}, "archived": {}})
+    path = base / "by_participant" / INDEX_NAME
+    try:
+        with path.open("rb") as f:
+            f.seek(st["offset"])
+            chunk = f.read()
+    except FileNotFoundError:
+        return st
+    end = chunk.rfind(b"\n") + 1
+    for line in chunk[:end].splitlines():
+        try:
+            e = json.loads(line)
+        except ValueError:
+            continue
+        st["map"].setdefault(e["id"], e["folder"])
+        if "archive" in e:
+            if e["archive"]:
+                st["archived"][e["folder"]] = e["archive"]
+            else:
+                st["archived"].pop(e["folder"], None)
+    st["offset"] += end
+    return st
+
+def _index_add(base: Path, participant_id: str, rel: str, **extra):
+    line = (json.dumps({"id": participant_id, "folder": rel, **extra}) + "\n").encode("utf-8")
+    path = base / "by_participant" / INDEX_NAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+def lookup_folder(base: Path, participant_id: str) -> Path | None:
+    """O(1) participant_id -> folder lookup via the index (None if never written)."""
+    with _index_lock:
+        m = _index_state(base)["map"]
+        rel = m.get(participant_id)
+    return (base / "by_participant" / rel) if rel else None
+
+def indexed_folders(base: Path) -> list[str]:
+    """Folders (relative to by_participant/) of every indexed participant."""
+    with _index_lock:
+        return list(_index_state(base)["map"].values())
+
+def indexed_participants(base: Path) -> dict[str, str]:
+    with _index_lock:
+        return dict(_index_state(base)["map"])
+
+def archived_folders(base: Path) -> dict[str, str]:
+    """{rel_folder: rel_archive} for folders that were archived and not restored since."""
+    with _index_lock:
+        return dict(_index_state(base)["archived"])
+
+def mark_archived(base: Path, participant_id: str, archive_rel: str):
+    rel = lookup_folder(base, participant_id).relative_to(base / "by_participant").as_posix()
+    _index_add(base, participant_id, rel, archive=archive_rel)
+
+def participant_file(base: Path, rel: str, name: str):
+    """
+    A participant's file as a Path, or an archive member with the same read
+    API when the folder has been archived; None if neither has it.
+    """
+    path = base / "by_participant" / rel / name
+    if path.is_file():
+        return path
+    arc = archived_folders(base).get(rel)
+    if arc is None or path.parent.is_dir():
+        return None
+    from . import archive
+    member = archive.ArchiveMember(str(base / "by_participant" / arc), rel, name)
+    return member if name in archive.read_index(Path(member.archive)).get(rel, {}) else None
+
+def _restore(base: Path, participant_id: str, rel: str, arc: str):
+    # Called with _index_lock held: the participant gets new rows, so the
+    # folder comes back out of the archive before anything is appended.
+    from . import archive
+    folder = base / "by_participant" / rel
+    if not folder.is_dir():
+        archive.extract(base / "by_participant" / arc, rel, folder)
+    _index_add(base, participant_id, rel, archive=None)
+    _index_state(base)
 
 def _p_folder(base: Path, p) -> Path:
-    label = _label_for_participant(p)
-    return base / "by_participant" / label
+    with _index_lock:
+        # Always catch up on the index (a tail read): `archive` may have packed
+        # this folder from another process since the last write.
+        rel = _index_state(base)["map"].get(p.id)
+        if rel is None:
+            rel = f"{_shard_for(p.id, getattr(p, 'participant_no', None))}/{_label_for_participant(p)}"
+            _index_add(base, p.id, rel)
+            # Another worker may have indexed this participant first; its entry wins.
+            rel = _index_state(base)["map"].get(p.id, rel)
+        arc = _index[base]["archived"].get(rel)
+        if arc is not None:
+            _restore(base, p.id, rel, arc)
+    return base / "by_participant" / rel
 
+def _info_from_folder(folder: Path) -> tuple[str | None, int | None]:
+    try:
+        with (folder / "info.csv").open(newline="", encoding="utf-8") as f:
+            row = next(csv.DictReader(f), None) or {}
+    except OSError:
+        row = {}
+    pid = row.get("participant_id") or None
+    pno = row.get("participant_no") or None
+    if pid is None:
+        m = re.match(r"^NA_(p_[A-Za-z0-9_-]{11})_", folder.name)
+        pid = m.group(1) if m else None
+    if pno is None:
+        m = re.match(r"^(\d+)_", folder.name)
+        pno = m.group(1) if m else None
+    return pid, (int(pno) if pno not in (None, "") else None)
 
-def record_participant(p, mode: str = "research"):
-    base = _dir_for_mode(mode)
-    _ensure_base(base)
-    row = {
+def migrate_layout(base: Path) -> dict:
+    """
+    Moves flat by_participant/<label>/ folders into their shard and indexes them.
+    Safe to re-run; folders already inside a shard are only (re)indexed.
+    """
+    root = base / "by_participant"
+    stats = {"moved": 0, "indexed": 0, "skipped": []}
+    if not root.is_dir():
+        return stats
+    with _index_lock:
+        known = dict(_index_state(base)["map"])
+    for d in sorted(root.iterdir()):
+        if not d.is_dir():
+            continue
+        folders = sorted(x for x in d.iterdir() if x.is_dir()) if _SHARD_RE.match(d.name) else [d]
+        for folder in folders:
+            pid, pno = _info_from_folder(folder)
+            if pid is None and pno is None:
+                stats["skipped"].append(str(folder))
+                continue
+            rel = f"{_shard_for(pid, pno)}/{folder.name}"
+            dest = root / rel
+            if folder != dest:
+                if dest.exists():
+                    stats["skipped"].append(str(folder))
+                    continue
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(folder), str(dest))
+                stats["moved"] += 1
+            if pid is not None and pid not in known:
+                _index_add(base, pid, rel)
+                known[pid] = rel
+                stats["indexed"] += 1
+    with _index_lock:
+        _index_state(base)
+    return stats
+
+
+def participant_row(p) -> dict:
+    return {
         "participant_no": getattr(p, "participant_no", None),
         "participant_id": p.id,
         "created_at": _iso(p.created_at),
@@ -56,39 +276,20 @@ def record_participant(p, mode: str = "research"):
         "email": p.email,
         "consent": bool(p.consent),
     }
-    _write_row(base / "participants.csv",
-               ["participant_no","participant_id","created_at","name","email","consent"],
-               row)
-    pf = _p_folder(base, p)
-    _write_row(pf / "info.csv",
-               ["participant_no","participant_id","created_at","name","email","consent"],
-               row)
 
-def record_demographics(p, mode: str = "research"):
-    base = _dir_for_mode(mode)
-    _ensure_base(base)
+def demographics_row(p, updated_at: datetime | None = None) -> dict:
     d = p.demographics
-    if not d: return
-    row = {
+    return {
         "participant_no": getattr(p, "participant_no", None),
         "participant_id": p.id,
         "age_band": d.age_band,
         "gender": d.gender,
         "puzzle_experience": d.puzzle_experience,
-        "updated_at": _iso(datetime.utcnow()),
+        "updated_at": _iso(updated_at or d.updated_at or datetime.utcnow()),
     }
-    _write_row(base / "demographics.csv",
-               ["participant_no","participant_id","age_band","gender","puzzle_experience","updated_at"],
-               row)
-    pf = _p_folder(base, p)
-    _write_row(pf / "demographics.csv",
-               ["participant_no","participant_id","age_band","gender","puzzle_experience","updated_at"],
-               row)
 
-def record_level(p, sess, lvl, mode: str = "research"):
-    base = _dir_for_mode(mode)
-    _ensure_base(base)
-    row = {
+def level_row(p, sess, lvl) -> dict:
+    return {
         "participant_no": getattr(p, "participant_no", None),
         "participant_id": p.id,
         "session_id": sess.id,
@@ -102,19 +303,134 @@ def record_level(p, sess, lvl, mode: str = "research"):
         "moves": lvl.moves,
         "time_ms": lvl.time_ms,
     }
-    _write_row(base / "levels.csv",
-               ["participant_no","participant_id","session_id","level_index","condition","difficulty","shuffle_steps",
-                "started_at","completed_at","completed","moves","time_ms"],
-               row)
+
+def record_participant(p, mode: str = "research"):
+    base = _dir_for_mode(mode)
+    _ensure_base(base)
+    row = participant_row(p)
+    _write_row(base / "participants.csv", PARTICIPANT_HEADERS, row)
+    pf = _p_folder(base, p)
+    _write_row(pf / "info.csv", PARTICIPANT_HEADERS, row)
+
+def record_demographics(p, mode: str = "research"):
+    base = _dir_for_mode(mode)
+    _ensure_base(base)
+    if not p.demographics: return
+    row = demographics_row(p)
+    _write_row(base / "demographics.csv", DEMOGRAPHICS_HEADERS, row)
+    pf = _p_folder(base, p)
+    _write_row(pf / "demographics.csv", DEMOGRAPHICS_HEADERS, row)
+
+def record_level(p, sess, lvl, mode: str = "research"):
+    base = _dir_for_mode(mode)
+    _ensure_base(base)
+    row = level_row(p, sess, lvl)
+    _write_row(base / "levels.csv", LEVEL_HEADERS, row)
     pf = _p_folder(base, p)
-    _write_row(pf / "levels.csv",
-               ["participant_no","participant_id","session_id","level_index","condition","difficulty","shuffle_steps",
-                "started_at","completed_at","completed","moves","time_ms"],
-               row)
+    _write_row(pf / "levels.csv", LEVEL_HEADERS, row)
+
+    obs = [("level_completed", f"{lvl.difficulty}|{lvl.condition}", 1.0 if lvl.completed else 0.0)]
+    if lvl.completed:
+        obs += [("level_time_ms", lvl.difficulty, lvl.time_ms), ("level_moves", lvl.difficulty, lvl.moves)]
+    aggregates.observe_many(mode, obs)
+
+def _metric(v):
+    # Client-reported number -> rounded float, or "" for anything else.
+    if isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v):
+        return ""
+    return v if isinstance(v, int) else round(v, 2)
+
+def level_telemetry_row(p, sess, lvl, telemetry: dict, submitted_at: datetime) -> dict:
+    row = {
+        "participant_no": getattr(p, "participant_no", None),
+        "participant_id": p.id,
+        "session_id": sess.id,
+        "level_index": lvl.index,
+        "condition": lvl.condition,
+        "difficulty": lvl.difficulty,
+        "ts": _iso(submitted_at),
+    }
+    row.update({k: _metric(telemetry.get(k)) for k in TELEMETRY_FIELDS})
+    return row
+
+def record_level_telemetry(p, sess, lvl, telemetry: dict, mode: str = "research",
+                           submitted_at: datetime | None = None):
+    """
+    Appends the client's frame / input-to-paint stats for one level. Not stored
+    in the DB: the per-participant file is the source `rebuild` merges from.
+    """
+    base = _dir_for_mode(mode)
+    _ensure_base(base)
+    row = level_telemetry_row(p, sess, lvl, telemetry, submitted_at or datetime.utcnow())
+    _write_row(base / "level_telemetry.csv", LEVEL_TELEMETRY_HEADERS, row)
+    pf = _p_folder(base, p)
+    _write_row(pf / "level_telemetry.csv", LEVEL_TELEMETRY_HEADERS, row)
+
+# --- Snapshots (export_snapshot on disk, snapshot_zip as a download) ---
+# Each table is (file name, header, rows(db, participants, where)); `participants`
+# is a zero-arg callable returning an iterable of Participant rows with sessions,
+# levels and demographics loaded, so it can be re-run per table over a DB cursor.
+# `where` selects the same participants in SQL (a condition on Participant) for
+# the tables read straight from the DB.
+def _snapshot_participants(db, participants, where):
+    for p in participants():
+        yield [getattr(p,"participant_no",None), p.id, _iso(p.created_at), p.name, p.email, int(bool(p.consent))]
+
+def _snapshot_demographics(db, participants, where):
+    for p in participants():
+        if p.demographics:
+            d = p.demographics
+            yield [getattr(p,"participant_no",None), p.id, d.age_band, d.gender, d.puzzle_experience]
+
+def _snapshot_levels(db, participants, where):
+    for p in participants():
+        for s in p.sessions:
+            for lvl in s.levels:
+                yield [getattr(p,"participant_no",None), p.id, s.id, lvl.index, lvl.condition, lvl.difficulty,
+                       lvl.shuffle_steps, _iso(lvl.started_at), _iso(lvl.completed_at),
+                       int(bool(lvl.completed)), lvl.moves, lvl.time_ms]
+
+def _snapshot_response_table(model_name: str, cols: list[str]):
+    def rows(db, participants, where):
+        from sqlalchemy import select
+        from .. import models
+        M = getattr(models, model_name)
+        q = (select(models.Participant.participant_no, *[getattr(M, c) for c in cols])
+             .join(models.Participant, models.Participant.id == M.participant_id)
+             .where(where)
+             .order_by(M.id).execution_options(yield_per=SNAPSHOT_BATCH))
+        for r in db.execute(q):
+            yield [(_iso(v) if isinstance(v, datetime) else v) for v in r]
+    return rows
+
+SNAPSHOT_BATCH = 500
+SNAPSHOT_TABLES = [
+    ("participants.csv", ["participant_no","participant_id","created_at","name","email","consent"],
+     _snapshot_participants),
+    ("demographics.csv", ["participant_no","participant_id","age_band","gender","puzzle_experience"],
+     _snapshot_demographics),
+    ("levels.csv", ["participant_no","participant_id","session_id","level_index","condition","difficulty",
+                    "shuffle_steps","started_at","completed_at","completed","moves","time_ms"],
+     _snapshot_levels),
+    ("tlx_slider_ratings.csv", ["participant_no","participant_id","session_id","level_index","dimension",
+                                "rating","submitted_at"],
+     _snapshot_response_table("TlxSliderRating", ["participant_id","session_id","level_index","dimension",
+                                                  "rating","submitted_at"])),
+    ("tlx_descriptive_answers.csv", ["participant_no","participant_id","session_id","level_index","dimension",
+                                     "text","llm_valid","llm_reason","llm_source","llm_quality",
+                                     "llm_likert","llm_explanation","submitted_at"],
+     _snapshot_response_table("TlxDescriptiveAnswer", ["participant_id","session_id","level_index","dimension",
+                                                       "text","llm_valid","llm_reason","llm_source","llm_quality",
+                                                       "llm_likert","llm_explanation","submitted_at"])),
+    ("post_survey_answers.csv", ["participant_no","participant_id","session_id","question_key","response",
+                                 "submitted_at"],
+     _snapshot_response_table("PostSurveyAnswer", ["participant_id","session_id","question_key","response",
+                                                   "submitted_at"])),
+]
 
 def export_snapshot(db, participants, levels_dir: Path | None = None) -> str:
     """
-    Unchanged: writes a full snapshot under ./data/exports/...
+    Writes a full snapshot (SNAPSHOT_TABLES) under ./data/exports/<ts>/.
     """
     base = BASE_DIR
     (base / "exports").mkdir(parents=True, exist_ok=True)
@@ -122,40 +438,83 @@ def export_snapshot(db, participants, levels_dir: Path | None = None) -> str:
     root = base / "exports" / ts
     root.mkdir(parents=True, exist_ok=True)
 
-    with (root / "participants.csv").open("w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["participant_no","participant_id","created_at","name","email","consent"])
-        for p in participants:
-            w.writerow([getattr(p,"participant_no",None), p.id, _iso(p.created_at), p.name, p.email, int(bool(p.consent))])
-
-    with (root / "demographics.csv").open("w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["participant_no","participant_id","age_band","gender","puzzle_experience"])
-        for p in participants:
-            if p.demographics:
-                d = p.demographics
-                w.writerow([getattr(p,"participant_no",None), p.id, d.age_band, d.gender, d.puzzle_experience])
-
-    L = []
-    for p in participants:
-        for s in p.sessions:
-            for lvl in s.levels:
-                L.append((p, s, lvl))
-    with (root / "levels.csv").open("w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["participant_no","participant_id","session_id","level_index","condition","difficulty","shuffle_steps",
-                    "started_at","completed_at","completed","moves","time_ms"])
-        for p,s,lvl in L:
-            w.writerow([getattr(p,"participant_no",None), p.id, s.id, lvl.index, lvl.condition, lvl.difficulty,
-                        lvl.shuffle_steps, _iso(lvl.started_at), _iso(lvl.completed_at),
-                        int(bool(lvl.completed)), lvl.moves, lvl.time_ms])
+    from ..models import Participant
+
+    participants = list(participants)
+    where = Participant.id.in_([p.id for p in participants])
+    for name, headers, rows in SNAPSHOT_TABLES:
+        with (root / name).open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(headers)
+            w.writerows(rows(db, lambda: participants, where))
 
     return str(root)
 
-def record_tlx_slider(p, sess, lvl, ratings: dict, mode: str = "research"):
-    base = _dir_for_mode(mode)
-    _ensure_base(base)
-    ts = datetime.utcnow().isoformat(timespec="seconds")
+class _ZipSink:
+    # Write-only, unseekable file object: zipfile falls back to data
+    # descriptors, and whatever it has written is drained after each chunk.
+    def __init__(self):
+        self.buf = bytearray()
+
+    def write(self, b) -> int:
+        self.buf += b
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = bytes(self.buf)
+        self.buf.clear()
+        return out
+
+def snapshot_zip(mode: str | None = None, chunk_bytes: int = 1 << 16):
+    """
+    Yields a ZIP of SNAPSHOT_TABLES chunk by chunk, straight from DB cursors
+    (yield_per batches). Nothing is staged on disk and memory stays bounded by
+    one batch plus one chunk. mode: 'research' (numbered participants),
+    'pilot' (unnumbered) or None for everyone.
+    """
+    import io, zipfile
+    from sqlalchemy import select, true
+    from sqlalchemy.orm import selectinload
+    from ..db import SessionLocal
+    from ..models import Participant, Session as DBSession
+
+    if mode == "research":
+        where = Participant.participant_no.is_not(None)
+    elif mode == "pilot":
+        where = Participant.participant_no.is_(None)
+    else:
+        where = true()
+
+    def participants():
+        q = select(Participant).options(
+            selectinload(Participant.sessions).selectinload(DBSession.levels),
+            selectinload(Participant.demographics),
+        ).where(where).order_by(Participant.created_at, Participant.id).execution_options(yield_per=SNAPSHOT_BATCH)
+        return db.scalars(q)
+
+    sink = _ZipSink()
+    with SessionLocal() as db, zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        for name, headers, rows in SNAPSHOT_TABLES:
+            text = io.StringIO()
+            w = csv.writer(text)
+            w.writerow(headers)
+            with zf.open(name, "w", force_zip64=True) as entry:
+                for row in rows(db, participants, where):
+                    w.writerow(row)
+                    if text.tell() >= chunk_bytes:
+                        entry.write(text.getvalue().encode("utf-8"))
+                        text.seek(0)
+                        text.truncate()
+                        if sink.buf:
+                            yield sink.drain()
+                entry.write(text.getvalue().encode("utf-8"))
+            yield sink.drain()
+    yield sink.drain()
+
+def tlx_slider_row(p, sess, lvl, ratings: dict, submitted_at: datetime) -> dict:
     row = {
         "participant_no": getattr(p, "participant_no", None),
         "participant_id": p.id,
@@ -164,20 +523,12 @@ def record_tlx_slider(p, sess, lvl, ratings: dict, mode: str = "research"):
         "condition": lvl.condition,
         "difficulty": lvl.difficulty,
         "tlx_type": "slider",
-        "ts": ts,
+        "ts": _iso(submitted_at),
     }
     row.update(ratings)
-    headers = ["participant_no","participant_id","session_id","level_index",
-               "condition","difficulty","tlx_type","ts",
-               "Mental Demand","Physical Demand","Temporal Demand","Performance","Effort","Frustration"]
-    _write_row(base / "tlx_slider.csv", headers, row)
-    pf = _p_folder(base, p); _write_row(pf / "tlx_slider.csv", headers, row)
-
-def record_tlx_descriptive(p, sess, lvl, validated: dict, mode: str = "research"):
-    base = _dir_for_mode(mode)
-    _ensure_base(base)
-    ts = datetime.utcnow().isoformat(timespec="seconds")
+    return row
 
+def tlx_wide_row(p, sess, lvl, validated: dict, submitted_at: datetime) -> dict:
     wide = {
         "participant_no": getattr(p, "participant_no", None),
         "participant_id": p.id,
@@ -186,91 +537,115 @@ def record_tlx_descriptive(p, sess, lvl, validated: dict, mode: str = "research"
         "condition": lvl.condition,
         "difficulty": lvl.difficulty,
         "tlx_type": "descriptive",
-        "ts": ts,
+        "ts": _iso(submitted_at),
     }
-    for d in ["Mental Demand","Physical Demand","Temporal Demand","Performance","Effort","Frustration"]:
+    for d in TLX_DIMS:
         wide[f"{d}__text"] = (validated.get(d, {}) or {}).get("text", "")
-    wide_headers = ["participant_no","participant_id","session_id","level_index",
-                    "condition","difficulty","tlx_type","ts"] + \
-                   [f"{d}__text" for d in ["Mental Demand","Physical Demand","Temporal Demand","Performance","Effort","Frustration"]]
-    _write_row(base / "tlx_descriptive_wide.csv", wide_headers, wide)
-    pf = _p_folder(base, p); _write_row(pf / "tlx_descriptive_wide.csv", wide_headers, wide)
-
-    long_headers = ["participant_no","participant_id","session_id","level_index","condition",
-                    "difficulty","tlx_type","dimension","text",
-                    "llm_valid","llm_reason","llm_source","llm_quality",
-                    "llm_likert","llm_explanation","ts"]
-    for dim, v in validated.items():
-        long_row = {
-            "participant_no": getattr(p, "participant_no", None),
-            "participant_id": p.id,
-            "session_id": sess.id,
-            "level_index": lvl.index,
-            "condition": lvl.condition,
-            "difficulty": lvl.difficulty,
-            "tlx_type": "descriptive",
-            "dimension": dim,
-            "text": v.get("text",""),
-            "llm_valid": v.get("llm_valid"),
-            "llm_reason": v.get("llm_reason"),
-            "llm_source": v.get("llm_source"),
-            "llm_quality": v.get("llm_quality"),
-            "llm_likert": v.get("llm_likert"),
-            "llm_explanation": v.get("llm_explanation"),
-            "ts": ts
-        }
-        _write_row(base / "tlx_descriptive_long.csv", long_headers, long_row)
-        _write_row(pf / "tlx_descriptive_long.csv", long_headers, long_row)
-
-def record_post_survey(p, sess, answers: dict, mode: str = "research"):
-    base = _dir_for_mode(mode)
-    _ensure_base(base)
-    ts = datetime.utcnow().isoformat(timespec="seconds")
-
-    # Map form keys -> human-readable question text
-    q_text = {
-        "method_natural": "Which method felt more natural to describe your workload?",
-        "method_nuance": "Which captured nuances or context better?",
-        "summarization_fairness_text": "If descriptive answers are summarized into 1–7 later, how fair/accurate would that feel?",
-        "method_why": "Briefly, which method did you prefer over the other and why?",
+    return wide
 
+def tlx_long_row(p, sess, lvl, dim: str, v: dict, submitted_at: datetime) -> dict:
+    return {
+        "participant_no": getattr(p, "participant_no", None),
+        "participant_id": p.id,
+        "session_id": sess.id,
+        "level_index": lvl.index,
+        "condition": lvl.condition,
+        "difficulty": lvl.difficulty,
+        "tlx_type": "descriptive",
+        "dimension": dim,
+        "text": v.get("text",""),
+        "llm_valid": v.get("llm_valid"),
+        "llm_reason": v.get("llm_reason"),
+        "llm_source": v.get("llm_source"),
+        "llm_quality": v.get("llm_quality"),
+        "llm_likert": v.get("llm_likert"),
+        "llm_explanation": v.get("llm_explanation"),
+        "ts": _iso(submitted_at)
     }
 
-    # ---- Wide row (one row per participant/session) ----
-    wide_row = {
+def _post_answer(v) -> str:
+    if v is None:
+        v = ""
+    if not isinstance(v, str):
+        v = str(v)
+    return v.strip()
+
+def post_wide_row(p, sess, answers: dict, submitted_at: datetime) -> dict:
+    row = {
         "participant_no": getattr(p, "participant_no", None),
         "participant_id": p.id,
         "session_id": sess.id,
-        "ts": ts,
+        "ts": _iso(submitted_at),
     }
-    for k in q_text.keys():
+    for k in POST_QUESTIONS:
         v = answers.get(k, "")
-        if isinstance(v, str):
-            v = v.strip()
-        wide_row[k] = v
+        row[k] = v.strip() if isinstance(v, str) else v
+    return row
+
+def post_long_rows(p, sess, answers: dict, submitted_at: datetime) -> list[dict]:
+    return [{
+        "participant_no": getattr(p, "participant_no", None),
+        "participant_id": p.id,
+        "session_id": sess.id,
+        "ts": _iso(submitted_at),
+        "question_key": k,
+        "question": q,
+        "response": _post_answer(answers.get(k, "")),
+    } for k, q in POST_QUESTIONS.items()]
+
+# submitted_at: pass the timestamp stored with the DB rows so a rebuild
+# reproduces the same ts column.
+def record_tlx_slider(p, sess, lvl, ratings: dict, mode: str = "research", submitted_at: datetime | None = None):
+    base = _dir_for_mode(mode)
+    _ensure_base(base)
+    row = tlx_slider_row(p, sess, lvl, ratings, submitted_at or datetime.utcnow())
+    _write_row(base / "tlx_slider.csv", TLX_SLIDER_HEADERS, row)
+    pf = _p_folder(base, p); _write_row(pf / "tlx_slider.csv", TLX_SLIDER_HEADERS, row)
+    aggregates.observe_many(mode, [("tlx_slider", f"{lvl.condition}|{d}", v) for d, v in ratings.items()])
+
+def record_tlx_descriptive(p, sess, lvl, validated: dict, mode: str = "research",
+                           submitted_at: datetime | None = None):
+    base = _dir_for_mode(mode)
+    _ensure_base(base)
+    submitted_at = submitted_at or datetime.utcnow()
 
-    wide_headers = ["participant_no","participant_id","session_id","ts"] + list(q_text.keys())
-    _write_row(base / "post_survey.csv", wide_headers, wide_row)
+    wide = tlx_wide_row(p, sess, lvl, validated, submitted_at)
+    _write_row(base / "tlx_descriptive_wide.csv", TLX_WIDE_HEADERS, wide)
+    pf = _p_folder(base, p); _write_row(pf / "tlx_descriptive_wide.csv", TLX_WIDE_HEADERS, wide)
+
+    # Long rows carry the score, so unscored dimensions are written later by
+    # record_tlx_rating once the rating job finishes.
+    for dim, v in validated.items():
+        if v.get("llm_likert") is None:
+            continue
+        long_row = tlx_long_row(p, sess, lvl, dim, v, submitted_at)
+        _write_row(base / "tlx_descriptive_long.csv", TLX_LONG_HEADERS, long_row)
+        _write_row(pf / "tlx_descriptive_long.csv", TLX_LONG_HEADERS, long_row)
+    aggregates.observe_many(mode, [("tlx_llm", f"{lvl.condition}|{dim}", v["llm_likert"])
+                                   for dim, v in validated.items() if v.get("llm_likert") is not None])
+
+def record_tlx_rating(p, sess, lvl, dim: str, v: dict, submitted_at: datetime, mode: str = "research"):
+    """Long row for one dimension whose deferred rating just landed."""
+    base = _dir_for_mode(mode)
+    _ensure_base(base)
+    long_row = tlx_long_row(p, sess, lvl, dim, v, submitted_at)
+    _write_row(base / "tlx_descriptive_long.csv", TLX_LONG_HEADERS, long_row)
+    pf = _p_folder(base, p); _write_row(pf / "tlx_descriptive_long.csv", TLX_LONG_HEADERS, long_row)
+    if v.get("llm_likert") is not None:
+        aggregates.observe(mode, "tlx_llm", f"{lvl.condition}|{dim}", v["llm_likert"])
+
+def record_post_survey(p, sess, answers: dict, mode: str = "research", submitted_at: datetime | None = None):
+    base = _dir_for_mode(mode)
+    _ensure_base(base)
+    submitted_at = submitted_at or datetime.utcnow()
+
+    # ---- Wide row (one row per participant/session) ----
+    wide_row = post_wide_row(p, sess, answers, submitted_at)
+    _write_row(base / "post_survey.csv", POST_WIDE_HEADERS, wide_row)
     pf = _p_folder(base, p)
-    _write_row(pf / "post_survey.csv", wide_headers, wide_row)
+    _write_row(pf / "post_survey.csv", POST_WIDE_HEADERS, wide_row)
 
     # ---- Long rows (one row per question) ----
-    long_headers = ["participant_no","participant_id","session_id","ts","question_key","question","response"]
-    for k, q in q_text.items():
-        v = answers.get(k, "")
-        if v is None:
-            v = ""
-        if not isinstance(v, str):
-            v = str(v)
-        long_row = {
-            "participant_no": getattr(p, "participant_no", None),
-            "participant_id": p.id,
-            "session_id": sess.id,
-            "ts": ts,
-            "question_key": k,
-            "question": q,
-            "response": v.strip(),
-        }
-        _write_row(base / "post_survey_long.csv", long_headers, long_row)
-        _write_row(pf / "post_survey_long.csv", long_headers, long_row)
-
+    for long_row in post_long_rows(p, sess, answers, submitted_at):
+        _write_row(base / "post_survey_long.csv", POST_LONG_HEADERS, long_row)
+        _write_row(pf / "post_survey_long.csv", POST_LONG_HEADERS, long_row)
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import os, logging, threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, insert, func, or_, and_
+
+from . import llm_tlx, exporter, tlx_cache, metrics
+
+log = logging.getLogger("jobs")
+
+# Durable queue for deferred rate_descriptive calls, stored in the `rating_jobs`
+# table so pending work survives restarts. Workers claim a job with a conditional
+# UPDATE (safe across threads and processes) and hold it under a lease; a job
+# whose worker died is picked up again once its lease runs out. Failures retry
+# with exponential backoff, and the last attempt falls back to the offline
+# heuristic so the answer still gets a score. A job that errors out even then,
+# or whose worker dies during the last attempt, is marked failed (logged, and
+# counted in rating_jobs_finished_total{status="failed"}).
+WORKERS = int(os.getenv("RATING_WORKERS", "2"))
+LEASE_S = float(os.getenv("RATING_LEASE_S", "120"))
+MAX_ATTEMPTS = int(os.getenv("RATING_MAX_ATTEMPTS", "5"))
+BACKOFF_S = 5.0
+BACKOFF_MAX_S = 300.0
+POLL_S = 2.0
+
+JOBS_FINISHED = metrics.Counter("rating_jobs_finished_total", "Rating jobs that reached a final state.", ["status"])
+
+_wake = threading.Event()
+_stop = threading.Event()
+_threads: list[threading.Thread] = []
+
+
+def enqueue(db, answer_ids: list[int], mode: str):
+    """Adds one job per answer; committed with the caller's transaction."""
+    from ..models import RatingJob
+
+    if not answer_ids:
+        return
+    now = datetime.utcnow()
+    db.execute(insert(RatingJob), [{"answer_id": a, "mode": mode, "status": "pending", "attempts": 0,
+                                    "run_after": now, "created_at": now, "updated_at": now}
+                                   for a in answer_ids])
+
+def wake():
+    _wake.set()
+
+
+def _claimable(RatingJob, now: datetime):
+    return or_(and_(RatingJob.status == "pending", RatingJob.run_after <= now),
+               and_(RatingJob.status == "running", RatingJob.lease_until < now))
+
+def claim(db):
+    """Leases the oldest runnable job, or returns None. Lost races just try the next candidate."""
+    from ..models import RatingJob
+
+    while True:
+        now = datetime.utcnow()
+        job_id = db.scalar(select(RatingJob.id).where(_claimable(RatingJob, now))
+                           .order_by(RatingJob.run_after, RatingJob.id).limit(1))
+        if job_id is None:
+            return None
+        res = db.execute(update(RatingJob)
+                         .where(RatingJob.id == job_id, _claimable(RatingJob, now))
+                         .values(status="running", attempts=RatingJob.attempts + 1,
+                                 lease_until=now + timedelta(seconds=LEASE_S), updated_at=now))
+        db.commit()
+        if res.rowcount == 1:
+            return db.get(RatingJob, job_id)
+
+def _finish(db, job, **values):
+    from ..models import RatingJob
+    # Only the current lease holder may finish the job.
+    res = db.execute(update(RatingJob).where(RatingJob.id == job.id, RatingJob.status == "running",
+                                             RatingJob.lease_until == job.lease_until)
+                     .values(updated_at=datetime.utcnow(), lease_until=None, **values))
+    return res.rowcount == 1
+
+def _retry(db, job, error: str):
+    """Back to pending with exponential backoff, or failed once the attempts are used up."""
+    if job.attempts >= MAX_ATTEMPTS:
+        if _finish(db, job, status="failed", last_error=error[:500]):
+            db.commit()
+            JOBS_FINISHED.inc(status="failed")
+            log.error("rating job %s failed after %s attempts: %s", job.id, job.attempts, error)
+        else:
+            db.rollback()
+        return
+    delay = min(BACKOFF_MAX_S, BACKOFF_S * 2 ** (job.attempts - 1))
+    _finish(db, job, status="pending", last_error=error[:500],
+            run_after=datetime.utcnow() + timedelta(seconds=delay))
+    db.commit()
+    log.warning("rating job %s failed (attempt %s): %s", job.id, job.attempts, error)
+
+def run(db, job):
+    """Rates one answer. The DB write and the job's completion commit together; the CSV row follows."""
+    if job.attempts > MAX_ATTEMPTS:
+        # Reclaimed after its lease ran out during the final attempt.
+        _retry(db, job, job.last_error or "worker died during the final attempt")
+        return
+    ans = job.answer
+    last = job.attempts >= MAX_ATTEMPTS
+    try:
+        score, expl = llm_tlx.rate_descriptive(ans.dimension, ans.text, fallback=last)
+    except Exception as e:
+        _retry(db, job, str(e))
+        return
+
+    if not _finish(db, job, status="done", last_error=None):
+        db.rollback()   # lease expired and someone else took over
+        return
+    ans.llm_likert, ans.llm_explanation = score, expl
+    db.commit()
+    JOBS_FINISHED.inc(status="done")
+
+    lvl = ans.level
+    v = {f: getattr(ans, f) for f in ("text", *tlx_cache.FIELDS)}
+    try:
+        exporter.record_tlx_rating(lvl.session.participant, lvl.session, lvl, ans.dimension, v,
+                                   ans.submitted_at, mode=job.mode)
+    except Exception as e:
+        log.warning("rating job %s: CSV write failed, run `rebuild` to restore: %s", job.id, e)
+    tlx_cache.store(db, ans.dimension, ans.text, v)
+
+def process_one() -> bool:
+    from ..db import SessionLocal
+    with SessionLocal() as db:
+        job = claim(db)
+        if job is None:
+            return False
+        try:
+            run(db, job)
+        except Exception as e:
+            db.rollback()
+            log.exception("rating job %s crashed: %s", job.id, e)
+            try:
+                _retry(db, job, f"crashed: {e}")
+            except Exception:
+                db.rollback()   # the lease runs out and the job is picked up again
+        return True
+
+def drain() -> int:
+    n = 0
+    while process_one():
+        n += 1
+    return n
+
+def counts(db) -> dict[str, int]:
+    from ..models import RatingJob
+    return dict(db.execute(select(RatingJob.status, func.count()).group_by(RatingJob.status)).all())
+
+
+def _worker():
+    while not _stop.is_set():
+        try:
+            busy = process_one()
+        except Exception as e:
+            log.warning("rating worker error: %s", e)
+            busy = False
+        if not busy:
+            _wake.wait(POLL_S)
+            # stop() sets _wake for every worker; only clear it while running.
+            if not _stop.is_set():
+                _wake.clear()
+
+def start(n: int = WORKERS):
+    _stop.clear()
+    for i in range(n):
+        t = threading.Thread(target=_worker, name=f"rating-worker-{i}", daemon=True)
+        t.start()
+        _threads.append(t)
+
+def stop(timeout: float = 5.0):
+    _stop.set()
+    _wake.set()
+    for t in _threads:
+        t.join(timeout)
+    _threads.clear()
@@ -1,24 +1,37 @@
 from __future__ import annotations
-import os, json, logging, re
+import os, json, logging, re, time, threading
 from typing import Optional, Tuple, Dict
 
+from . import metrics, tracing
+
 log = logging.getLogger("llm_tlx")
 
 # --- Config ---
 MIN_WORDS = 8  # >= 8 words (updated per your requirement)
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
-_USE_LLM = bool(os.getenv("OPENAI_API_KEY"))
 
-# Try to init client (safe if missing)
-client = None
-if _USE_LLM:
-    try:
-        from openai import OpenAI
-        client = OpenAI()
-    except Exception as e:
-        log.warning("OpenAI init failed: %s", e)
-        _USE_LLM = False
-        client = None
+# The OpenAI SDK is slow to import, so the client is built on first use
+# (or by the app's lifespan warm-up) instead of at import time.
+_client = None
+_client_ready = False
+_client_lock = threading.Lock()
+
+def get_client():
+    """Returns the shared OpenAI client, or None when no API key is set or init fails."""
+    global _client, _client_ready
+    if _client_ready:
+        return _client
+    with _client_lock:
+        if not _client_ready:
+            if os.getenv("OPENAI_API_KEY"):
+                try:
+                    from openai import OpenAI
+                    _client = OpenAI()
+                except Exception as e:
+                    log.warning("OpenAI init failed: %s", e)
+                    _client = None
+            _client_ready = True
+    return _client
 
 # --- Validator (system + user) ---
 VALIDATOR_RUBRIC = (
@@ -82,13 +95,22 @@ def _offline_valid(text: str) -> Tuple[bool, str, str, str]:
     quality = "high" if wc >= 15 else ("medium" if wc >= 10 else "low")
     return True, "OK", "offline", quality
 
+def _observe(stage: str, t0: float, source: str, outcome: str):
+    metrics.LLM_LATENCY.observe(time.perf_counter() - t0, stage=stage, source=source, outcome=outcome)
+
+@tracing.traced("llm.validate", key=0)
 def validate_descriptive(dimension: str, level_label: str, text: str,
-                         context: Optional[Dict[str,str]] = None) -> Tuple[bool, str, str, str]:
+                         context: Optional[Dict[str,str]] = None, offline: bool = False) -> Tuple[bool, str, str, str]:
     """
     Returns (passed: bool, reason: str, source: 'llm'|'offline', quality: 'high'|'medium'|'low'|'fail')
+    offline=True skips the LLM (used when admission control sheds load).
     """
-    if not _USE_LLM or client is None:
-        return _offline_valid(text)
+    t0 = time.perf_counter()
+    client = None if offline else get_client()
+    if client is None:
+        res = _offline_valid(text)
+        _observe("validate", t0, "offline", "pass" if res[0] else "fail")
+        return res
 
     ctx_lines = ""
     if context:
@@ -121,14 +143,17 @@ def validate_descriptive(dimension: str, level_label: str, text: str,
         reason  = str(data.get("reason", "") or ("OK" if passed else "Failed rubric."))
         quality = str(data.get("quality", "")).lower().strip()
         if not passed:
+            _observe("validate", t0, "llm", "fail")
             return False, reason, "llm", "fail"
         if quality not in {"high","medium","low"}:
             wc = len((text or "").split())
             quality = "high" if wc >= 40 else ("medium" if wc >= 25 else "low")
+        _observe("validate", t0, "llm", "pass")
         return True, reason, "llm", quality
     except Exception as e:
         log.warning("validate_descriptive LLM error: %s", e)
         ok, reason, src, q = _offline_valid(text)
+        _observe("validate", t0, src, "error")
         return ok, (reason if ok else f"Temporary validator issue: {e}"), src, q
 
 # --- Helpers for scoring ---
@@ -140,6 +165,8 @@ _NEG_SUCCESS = [
     "not successful","unsuccessful","failed","went poorly","did badly","struggled a lot"
 ]
 
+OFFLINE_EXPLANATION = "offline heuristic"
+
 def _offline_score(dimension: str, text: str) -> Tuple[int, str]:
     """
     Offline heuristic fallback for 1..7 scoring with dimension-aware tweaks.
@@ -148,12 +175,13 @@ def _offline_score(dimension: str, text: str) -> Tuple[int, str]:
     score = 4  # neutral start
 
     if dimension == "Performance":
-        if any(ph in txt for ph in _POS_SUCCESS): score = max(score, 6)
-        if any(ph in txt for ph in _NEG_SUCCESS): score = min(score, 2)
+        # Same scale as the rater prompt: 1 = very high success, 7 = very low success.
+        if any(ph in txt for ph in _POS_SUCCESS): score = min(score, 2)
+        if any(ph in txt for ph in _NEG_SUCCESS): score = max(score, 6)
         # generic cues
-        if "many mistakes" in txt or "lot of mistakes" in txt: score = min(score, 3)
-        if "few mistakes" in txt or "minimal mistakes" in txt: score = max(score, 5)
-        return score, "offline heuristic"
+        if "many mistakes" in txt or "lot of mistakes" in txt: score = max(score, 5)
+        if "few mistakes" in txt or "minimal mistakes" in txt: score = min(score, 3)
+        return score, OFFLINE_EXPLANATION
 
 
     inc = ["overwhelm","intense","very high","extreme","frustrat","stress","rushed","panic","pressure","hard"]
@@ -162,17 +190,24 @@ def _offline_score(dimension: str, text: str) -> Tuple[int, str]:
         if w in txt: score = min(7, score + 2)
     for w in dec:
         if w in txt: score = max(1, score - 2)
-    return score, "offline heuristic"
+    return score, OFFLINE_EXPLANATION
 
-def rate_descriptive(dimension: str, text: str) -> Tuple[int, str]:
+@tracing.traced("llm.rate", key=0)
+def rate_descriptive(dimension: str, text: str, offline: bool = False, fallback: bool = True) -> Tuple[int, str]:
     """
     Likert 1..7 + brief explanation. Uses the exact TLX question per dimension to stabilize polarity.
     IMPORTANT: Performance remains *non-inverted*: 1 = very high success, 7 = very low success.
     If you need TLX inversion for analytics, do it later: inv = 8 - score.
+    offline=True skips the LLM (used when admission control sheds load).
+    fallback=False re-raises LLM errors instead of scoring offline (the job queue retries).
     """
+    t0 = time.perf_counter()
     # Offline heuristic
-    if not _USE_LLM or client is None:
-        return _offline_score(dimension, text)
+    client = None if offline else get_client()
+    if client is None:
+        res = _offline_score(dimension, text)
+        _observe("rate", t0, "offline", "ok")
+        return res
 
     question = TLX_QUESTIONS.get(dimension, "")
 
@@ -207,18 +242,22 @@ def rate_descriptive(dimension: str, text: str) -> Tuple[int, str]:
         score = max(1, min(7, score))
         explanation = str(data.get("explanation", "")).strip()
 
-        # Tiny safety net for Performance polarity
+        # Tiny safety net for Performance polarity (1 = very high success)
         if dimension == "Performance":
             low = any(ph in (text or "").lower() for ph in _NEG_SUCCESS)
             high = any(ph in (text or "").lower() for ph in _POS_SUCCESS)
-            if high and score <= 3:
-                score = max(score, 6)
-            if low and score >= 5:
+            if high and score >= 5:
                 score = min(score, 2)
+            if low and score <= 3:
+                score = max(score, 6)
 
+        _observe("rate", t0, "llm", "ok")
         return score, (explanation or "OK")
     except Exception as e:
         log.warning("rate_descriptive LLM error: %s", e)
+        _observe("rate", t0, "offline" if fallback else "llm", "error")
+        if not fallback:
+            raise
         return _offline_score(dimension, text)
 
 
@@ -0,0 +1,21 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl  # POSIX; elsewhere the lock is a no-op
+except ImportError:
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive cross-process lock on `path` (created if missing), held for the block."""
+    with path.open("a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
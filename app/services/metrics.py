@@ -0,0 +1,283 @@
+from __future__ import annotations
+import os, json, time, threading, atexit
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from . import locks
+
+# Each worker keeps its series in memory and periodically snapshots them to
+# METRICS_DIR/<pid>.json; /metrics merges every snapshot so the numbers add up
+# across uvicorn/gunicorn workers. Snapshots of exited workers are folded into
+# METRICS_DIR/dead.json (counters and histograms only) and removed.
+METRICS_DIR = Path(os.getenv("METRICS_DIR") or Path(os.getenv("DATA_DIR", "./data")) / "meta" / "metrics")
+FLUSH_INTERVAL_S = float(os.getenv("METRICS_FLUSH_S", "2"))
+DEAD_NAME = "dead.json"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_lock = threading.Lock()
+_registry: dict[str, "_Metric"] = {}
+_dirty = False
+_flusher_pid: int | None = None
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: list[str] | tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.series: dict[tuple, object] = {}
+        _registry[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(l, "")) for l in self.labels)
+
+    def _meta(self) -> dict:
+        return {"kind": self.kind, "help": self.help, "labels": list(self.labels)}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        k = self._key(labels)
+        with _lock:
+            self.series[k] = self.series.get(k, 0.0) + amount
+        _maybe_flush()
+
+
+class Gauge(_Metric):
+    """Point-in-time value; summed across live workers when merged."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        k = self._key(labels)
+        with _lock:
+            self.series[k] = float(value)
+        _maybe_flush()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(float(b) for b in buckets)
+
+    def observe(self, value: float, **labels):
+        k = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with _lock:
+            s = self.series.get(k)
+            if s is None:
+                s = self.series[k] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+        _maybe_flush()
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _meta(self) -> dict:
+        return {**super()._meta(), "buckets": list(self.buckets)}
+
+
+# --- Metric definitions ---
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route.",
+                         ["method", "route", "status"])
+DB_QUERIES = Histogram("db_queries_per_request", "SQL statements executed per request.",
+                       ["route"], buckets=COUNT_BUCKETS)
+LLM_LATENCY = Histogram("llm_call_duration_seconds", "validate/rate latency by source and outcome.",
+                        ["stage", "source", "outcome"])
+EXPORT_WRITE = Histogram("exporter_write_duration_seconds", "CSV row write time per file.", ["file"])
+EXPORT_BYTES = Histogram("exporter_write_bytes", "Bytes appended per CSV row write.", ["file"],
+                         buckets=BYTES_BUCKETS)
+
+
+# --- Per-request DB query counting ---
+_db_queries: ContextVar[list | None] = ContextVar("db_queries", default=None)
+
+def instrument_engine(engine):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        c = _db_queries.get()
+        if c is not None:
+            c[0] += 1
+
+def begin_request():
+    return _db_queries.set([0])
+
+def end_request(token, method: str, route: str, status: int, elapsed_s: float):
+    c = _db_queries.get()
+    _db_queries.reset(token)
+    HTTP_LATENCY.observe(elapsed_s, method=method, route=route, status=status)
+    DB_QUERIES.observe(c[0] if c else 0, route=route)
+
+
+# --- Cross-worker snapshots ---
+def _snapshot() -> dict:
+    with _lock:
+        return {name: {**m._meta(),
+                       "series": [[list(k), (v if m.kind != "histogram" else [list(v[0]), v[1], v[2]])]
+                                  for k, v in m.series.items()]}
+                for name, m in _registry.items()}
+
+def flush():
+    global _dirty
+    _dirty = False
+    try:
+        METRICS_DIR.mkdir(parents=True, exist_ok=True)
+        path = METRICS_DIR / f"{os.getpid()}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(_snapshot()), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def _flusher():
+    while True:
+        time.sleep(FLUSH_INTERVAL_S)
+        if _dirty:
+            flush()
+
+def _maybe_flush():
+    # Updates only mark the snapshot dirty; a per-process daemon thread writes it
+    # every FLUSH_INTERVAL_S, so an idle worker's last counts still reach /metrics.
+    global _dirty, _flusher_pid
+    _dirty = True
+    if _flusher_pid != os.getpid():   # first update, or first after a fork
+        with _lock:
+            if _flusher_pid != os.getpid():
+                _flusher_pid = os.getpid()
+                threading.Thread(target=_flusher, name="metrics-flush", daemon=True).start()
+
+atexit.register(flush)
+
+def _alive(pid: str) -> bool:
+    if os.name != "posix" or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+def _combine(snaps) -> dict:
+    out: dict = {}
+    for snap in snaps:
+        for name, m in snap.items():
+            tgt = out.setdefault(name, {**{k: v for k, v in m.items() if k != "series"}, "series": {}})
+            for labels, v in m["series"]:
+                k = tuple(labels)
+                cur = tgt["series"].get(k)
+                if m["kind"] != "histogram":
+                    tgt["series"][k] = (cur or 0.0) + v
+                elif cur is None or len(cur[0]) != len(v[0]):
+                    tgt["series"][k] = [list(v[0]), v[1], v[2]]
+                else:
+                    cur[0] = [a + b for a, b in zip(cur[0], v[0])]
+                    cur[1] += v[1]
+                    cur[2] += v[2]
+    return out
+
+def _load(path: Path):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def _fold_dead(paths: list[Path]):
+    """
+    Adds exited workers' counters and histograms to DEAD_NAME and deletes their
+    snapshots, so totals stay monotonic while the directory only holds live
+    workers. `folded` remembers (pid, mtime) of snapshots already added, in case
+    a fold dies between writing DEAD_NAME and deleting them.
+    """
+    with locks.file_lock(METRICS_DIR / ".lock"):
+        arc_path = METRICS_DIR / DEAD_NAME
+        arc = _load(arc_path) or {"folded": [], "metrics": {}}
+        snaps, folded, done = [arc["metrics"]], set(), []
+        for f in paths:
+            try:
+                key = f"{f.stem}:{f.stat().st_mtime_ns}"
+            except OSError:
+                continue   # already folded by another worker
+            if key not in arc["folded"]:
+                snap = _load(f)
+                if snap is None:
+                    continue
+                snaps.append({n: m for n, m in snap.items() if m["kind"] != "gauge"})
+            folded.add(key)
+            done.append(f)
+        if len(snaps) > 1 or folded != set(arc["folded"]):
+            merged = _combine(snaps)
+            data = {"folded": sorted(folded),
+                    "metrics": {n: {**{k: v for k, v in m.items() if k != "series"},
+                                    "series": [[list(k), v] for k, v in m["series"].items()]}
+                                for n, m in merged.items()}}
+            tmp = arc_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp, arc_path)
+        for f in done:
+            f.unlink(missing_ok=True)
+
+def _merged() -> dict:
+    live, dead = [], []
+    for f in sorted(METRICS_DIR.glob("*.json")):
+        if f.name != DEAD_NAME:
+            (live if _alive(f.stem) else dead).append(f)
+    if dead:
+        try:
+            _fold_dead(dead)
+        except OSError:
+            pass
+    snaps = [s for s in map(_load, live) if s is not None]
+    arc = _load(METRICS_DIR / DEAD_NAME)
+    if arc:
+        snaps.append(arc["metrics"])
+    return _combine(snaps)
+
+def _fmt_labels(names, values, extra: tuple = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    esc = lambda s: str(s).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{n}="{esc(v)}"' for n, v in pairs) + "}"
+
+def _fmt_num(x) -> str:
+    return repr(float(x)) if isinstance(x, float) and not float(x).is_integer() else str(int(x))
+
+def render() -> str:
+    """Prometheus text exposition (format 0.0.4) merged across all workers."""
+    flush()
+    lines = []
+    for name, m in sorted(_merged().items()):
+        lines.append(f"# HELP {name} {m['help']}")
+        lines.append(f"# TYPE {name} {m['kind']}")
+        for k, v in sorted(m["series"].items()):
+            if m["kind"] != "histogram":
+                lines.append(f"{name}{_fmt_labels(m['labels'], k)} {_fmt_num(v)}")
+                continue
+            counts, total, n = v
+            running = 0
+            for le, c in zip(list(m["buckets"]) + ["+Inf"], counts):
+                running += c
+                le_s = le if isinstance(le, str) else _fmt_num(le)
+                lines.append(f"{name}_bucket{_fmt_labels(m['labels'], k, (('le', le_s),))} {running}")
+            lines.append(f"{name}_sum{_fmt_labels(m['labels'], k)} {_fmt_num(total)}")
+            lines.append(f"{name}_count{_fmt_labels(m['labels'], k)} {n}")
+    return "\n".join(lines) + "\n"
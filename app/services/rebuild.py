@@ -0,0 +1,307 @@
+from __future__ import annotations
+import os, csv, heapq, tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from . import exporter
+
+CHUNK_SIZE = 200
+MERGE_FAN_IN = 256   # max per-participant files held open by one merge pass
+
+
+def _write_atomic(path: Path, headers: list[str], rows) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=headers, extrasaction="ignore")
+            w.writeheader()
+            n = 0
+            for n, row in enumerate(rows, 1):
+                w.writerow(row)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return n
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+def _write_participant_chunk(jobs: list[tuple[str, dict]]) -> int:
+    """Worker: [(folder, {file: (headers, rows)})] -> number of files written."""
+    n = 0
+    for folder, files in jobs:
+        for name, (headers, rows) in files.items():
+            _write_atomic(Path(folder) / name, headers, rows)
+            n += 1
+    return n
+
+
+def _demographics_ts(p, folder: Path) -> datetime | None:
+    # Rows saved before demographics.updated_at existed keep the timestamp
+    # already in the participant's file (its last row is the current answer).
+    if p.demographics.updated_at is not None:
+        return p.demographics.updated_at
+    last = None
+    try:
+        for last in _csv_rows(folder / "demographics.csv"):
+            pass
+        return datetime.fromisoformat(last["updated_at"]) if last else None
+    except (OSError, KeyError, TypeError, ValueError):
+        return None
+
+def _participant_files(p, folder: Path) -> dict:
+    levels = sorted(((s, lvl) for s in p.sessions for lvl in s.levels if lvl.completed_at is not None),
+                    key=lambda x: (x[1].completed_at, x[1].index))
+    files = {
+        "info.csv": (exporter.PARTICIPANT_HEADERS, [exporter.participant_row(p)]),
+        "levels.csv": (exporter.LEVEL_HEADERS, [exporter.level_row(p, s, lvl) for s, lvl in levels]),
+    }
+    if p.demographics is not None:
+        ts = _demographics_ts(p, folder)
+        if ts is not None:   # otherwise the file is left as it is
+            files["demographics.csv"] = (exporter.DEMOGRAPHICS_HEADERS, [exporter.demographics_row(p, ts)])
+    files.update(_response_files(p))
+    return files
+
+def _submissions(rows, by_level: bool = True) -> list[tuple[tuple, list]]:
+    # Rows of one submission share (session, level, submitted_at); id order is insert order.
+    # Seconds match the CSV ts, so rows backfilled from CSV group with the originals.
+    groups: dict[tuple, list] = {}
+    for r in rows:
+        key = (r.submitted_at.replace(microsecond=0), r.level_index if by_level else 0, r.session_id)
+        groups.setdefault(key, []).append(r)
+    return sorted(groups.items(), key=lambda kv: kv[0])
+
+def _response_files(p) -> dict:
+    """
+    TLX and post-survey files from the DB. A file is only produced when the
+    participant has rows in the matching table, so folders written before the
+    tables existed keep their CSVs (see `import-responses` to backfill them).
+    """
+    sessions = {s.id: s for s in p.sessions}
+    levels = {lvl.id: lvl for s in p.sessions for lvl in s.levels}
+    files = {}
+    if p.tlx_slider_ratings:
+        rows = []
+        for (ts, _, sid), grp in _submissions(p.tlx_slider_ratings):
+            rows.append(exporter.tlx_slider_row(p, sessions[sid], levels[grp[0].level_id],
+                                                {r.dimension: r.rating for r in grp}, ts))
+        files["tlx_slider.csv"] = (exporter.TLX_SLIDER_HEADERS, rows)
+    if p.tlx_descriptive_answers:
+        wide, long = [], []
+        for (ts, _, sid), grp in _submissions(p.tlx_descriptive_answers):
+            sess, lvl = sessions[sid], levels[grp[0].level_id]
+            validated = {r.dimension: {"text": r.text, "llm_valid": r.llm_valid, "llm_reason": r.llm_reason,
+                                       "llm_source": r.llm_source, "llm_quality": r.llm_quality,
+                                       "llm_likert": r.llm_likert, "llm_explanation": r.llm_explanation}
+                         for r in grp}
+            wide.append(exporter.tlx_wide_row(p, sess, lvl, validated, ts))
+            # Unscored dimensions get their long row from the rating job (record_tlx_rating).
+            long.extend(exporter.tlx_long_row(p, sess, lvl, d, v, ts) for d, v in validated.items()
+                        if v["llm_likert"] is not None)
+        files["tlx_descriptive_wide.csv"] = (exporter.TLX_WIDE_HEADERS, wide)
+        files["tlx_descriptive_long.csv"] = (exporter.TLX_LONG_HEADERS, long)
+    if p.post_survey_answers:
+        wide, long = [], []
+        for (ts, _, sid), grp in _submissions(p.post_survey_answers, by_level=False):
+            answers = {r.question_key: r.response for r in grp}
+            wide.append(exporter.post_wide_row(p, sessions[sid], answers, ts))
+            long.extend(exporter.post_long_rows(p, sessions[sid], answers, ts))
+        files["post_survey.csv"] = (exporter.POST_WIDE_HEADERS, wide)
+        files["post_survey_long.csv"] = (exporter.POST_LONG_HEADERS, long)
+    return files
+
+def _participant_query(mode: str):
+    from ..models import Participant, Session as DBSession
+    # The DB doesn't store the mode; research participants are the numbered ones.
+    q = select(Participant).options(
+        selectinload(Participant.sessions).selectinload(DBSession.levels),
+        selectinload(Participant.demographics),
+        selectinload(Participant.tlx_slider_ratings),
+        selectinload(Participant.tlx_descriptive_answers),
+        selectinload(Participant.post_survey_answers),
+    )
+    if mode == "pilot":
+        return q.where(Participant.participant_no.is_(None)).order_by(Participant.created_at, Participant.id)
+    return q.where(Participant.participant_no.is_not(None)).order_by(Participant.participant_no)
+
+
+def _rows_sorted_by(path: Path, key_col: str, tiebreak: int):
+    with path.open(newline="", encoding="utf-8") as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            yield (row.get(key_col) or "", tiebreak, i), row
+
+def _kway_merge(paths: list[Path], out: Path, headers: list[str], key_col: str) -> int:
+    """
+    Merges per-participant CSVs (each already ordered by key_col) into one file
+    ordered by key_col. Inputs beyond MERGE_FAN_IN are merged in passes through
+    temp files so the number of open files stays bounded.
+    """
+    temps = []
+    try:
+        while len(paths) > MERGE_FAN_IN:
+            nxt = []
+            for i in range(0, len(paths), MERGE_FAN_IN):
+                fd, tmp = tempfile.mkstemp(dir=out.parent, prefix=f".{out.name}.pass.", suffix=".tmp")
+                os.close(fd)
+                temps.append(Path(tmp))
+                _kway_merge(paths[i:i + MERGE_FAN_IN], Path(tmp), headers, key_col)
+                nxt.append(Path(tmp))
+            paths = nxt
+        streams = [_rows_sorted_by(p, key_col, i) for i, p in enumerate(paths)]
+        merged = (row for _, row in heapq.merge(*streams, key=lambda kv: kv[0]))
+        return _write_atomic(out, headers, merged)
+    finally:
+        for t in temps:
+            t.unlink(missing_ok=True)
+
+def _merge_aggregate(base: str, folders: list[str], agg_name: str) -> tuple[str, int]:
+    src_name, key_col = exporter.AGGREGATE_FILES[agg_name]
+    # Archived folders are read from their shard archive (same read API as a Path).
+    paths = [f for f in (exporter.participant_file(Path(base), rel, src_name) for rel in folders) if f is not None]
+    out = Path(base) / agg_name
+    if not paths:
+        return agg_name, 0
+    with paths[0].open(newline="", encoding="utf-8") as f:
+        headers = next(csv.reader(f), None) or []
+    return agg_name, _kway_merge(paths, out, headers, key_col)
+
+
+def rebuild(mode: str = "research", workers: int | None = None, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Regenerates by_participant/ info, demographics, levels, TLX and post-survey
+    CSVs for `mode` from the database, then rebuilds every aggregate CSV by
+    k-way merging the per-participant files. Archived participants are not
+    rewritten; their files are merged straight from the archive. Per-participant writes fan out across a process pool
+    in chunks; every file is replaced atomically (temp file + rename).
+    Demographics keep their submission time (DB, else the existing file); with
+    neither, that participant's demographics.csv is left untouched.
+    """
+    from ..db import SessionLocal
+
+    base = exporter._dir_for_mode(mode)
+    exporter._ensure_base(base)
+    stats = {"participants": 0, "archived": 0, "files": 0, "demographics_kept": 0, "aggregates": {}}
+    archived = exporter.archived_folders(base)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        with SessionLocal() as db:
+            result = db.scalars(_participant_query(mode).execution_options(yield_per=chunk_size))
+            for part in result.partitions():
+                jobs = []
+                for p in part:
+                    # Archived participants are finished; keep them packed.
+                    rel = exporter.lookup_folder(base, p.id)
+                    if rel is not None and rel.relative_to(base / "by_participant").as_posix() in archived \
+                            and not rel.is_dir():
+                        stats["archived"] += 1
+                        continue
+                    folder = exporter._p_folder(base, p)
+                    files = _participant_files(p, folder)
+                    if p.demographics is not None and "demographics.csv" not in files:
+                        stats["demographics_kept"] += 1
+                    jobs.append((str(folder), files))
+                stats["participants"] += len(jobs)
+                futures.append(pool.submit(_write_participant_chunk, jobs))
+        stats["files"] = sum(f.result() for f in futures)
+
+        folders = sorted(set(exporter.indexed_folders(base)))
+        merges = [pool.submit(_merge_aggregate, str(base), folders, name) for name in exporter.AGGREGATE_FILES]
+        for f in merges:
+            name, rows = f.result()
+            stats["aggregates"][name] = rows
+    return stats
+
+
+def _csv_rows(path: Path):
+    if not path.is_file():
+        return
+    with path.open(newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+def _opt_bool(v: str):
+    return {"True": True, "False": False}.get((v or "").strip())
+
+def _opt_int(v: str):
+    v = (v or "").strip()
+    return int(float(v)) if v else None
+
+def _key_s(row) -> tuple:
+    *head, ts = row
+    return (*head, ts.replace(microsecond=0))
+
+def import_responses(mode: str = "research") -> dict:
+    """
+    One-off backfill: loads TLX and post-survey rows recorded only in the
+    aggregate CSVs into the response tables. Rows already present (same
+    session, level, dimension/question and timestamp) and rows whose session is
+    not in the DB are skipped, so it is safe to re-run.
+    """
+    from sqlalchemy import insert
+    from ..db import SessionLocal
+    from ..models import Level, Session as DBSession, TlxSliderRating, TlxDescriptiveAnswer, PostSurveyAnswer
+
+    base = exporter._dir_for_mode(mode)
+    stats = {"tlx_slider": 0, "tlx_descriptive": 0, "post_survey": 0, "skipped": 0}
+    with SessionLocal() as db:
+        levels = {(sid, idx): (lid, pid) for lid, sid, idx, pid in db.execute(
+            select(Level.id, Level.session_id, Level.index, DBSession.participant_id).join(DBSession))}
+        sessions = {sid: pid for sid, pid in db.execute(select(DBSession.id, DBSession.participant_id))}
+
+        # CSV ts has second resolution; compare DB timestamps at the same precision.
+        have_slider = set(map(_key_s, db.execute(select(TlxSliderRating.session_id, TlxSliderRating.level_index,
+                                            TlxSliderRating.dimension, TlxSliderRating.submitted_at))))
+        have_desc = set(map(_key_s, db.execute(select(TlxDescriptiveAnswer.session_id, TlxDescriptiveAnswer.level_index,
+                                          TlxDescriptiveAnswer.dimension, TlxDescriptiveAnswer.submitted_at))))
+        have_post = set(map(_key_s, db.execute(select(PostSurveyAnswer.session_id, PostSurveyAnswer.question_key,
+                                          PostSurveyAnswer.submitted_at))))
+
+        slider, desc, post = [], [], []
+        for row in _csv_rows(base / "tlx_slider.csv"):
+            key = (row["session_id"], int(row["level_index"]))
+            if key not in levels or not row.get("ts"):
+                stats["skipped"] += 1
+                continue
+            ts = datetime.fromisoformat(row["ts"])
+            for d in exporter.TLX_DIMS:
+                if (row.get(d) or "").strip() and (*key, d, ts) not in have_slider:
+                    slider.append({"participant_id": levels[key][1], "session_id": key[0], "level_id": levels[key][0],
+                                   "level_index": key[1], "dimension": d, "rating": int(row[d]), "submitted_at": ts})
+        for row in _csv_rows(base / "tlx_descriptive_long.csv"):
+            key = (row["session_id"], int(row["level_index"]))
+            if key not in levels or not row.get("ts"):
+                stats["skipped"] += 1
+                continue
+            ts = datetime.fromisoformat(row["ts"])
+            if (*key, row["dimension"], ts) in have_desc:
+                continue
+            desc.append({"participant_id": levels[key][1], "session_id": key[0], "level_id": levels[key][0],
+                         "level_index": key[1], "dimension": row["dimension"], "text": row.get("text") or "",
+                         "llm_valid": _opt_bool(row.get("llm_valid")), "llm_reason": row.get("llm_reason") or None,
+                         "llm_source": row.get("llm_source") or None, "llm_quality": row.get("llm_quality") or None,
+                         "llm_likert": _opt_int(row.get("llm_likert")),
+                         "llm_explanation": row.get("llm_explanation") or None, "submitted_at": ts})
+        for row in _csv_rows(base / "post_survey_long.csv"):
+            sid = row["session_id"]
+            if sid not in sessions or not row.get("ts"):
+                stats["skipped"] += 1
+                continue
+            ts = datetime.fromisoformat(row["ts"])
+            if (sid, row["question_key"], ts) in have_post:
+                continue
+            post.append({"participant_id": sessions[sid], "session_id": sid, "question_key": row["question_key"],
+                         "response": row.get("response") or "", "submitted_at": ts})
+
+        for M, rows, name in ((TlxSliderRating, slider, "tlx_slider"), (TlxDescriptiveAnswer, desc, "tlx_descriptive"),
+                              (PostSurveyAnswer, post, "post_survey")):
+            if rows:
+                db.execute(insert(M), rows)
+            stats[name] = len(rows)
+        db.commit()
+    return stats
@@ -0,0 +1,63 @@
+from __future__ import annotations
+import hashlib, logging
+from datetime import datetime
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+
+from . import llm_tlx
+
+log = logging.getLogger("tlx_cache")
+
+# Server-side memo of LLM results for descriptive TLX answers, keyed by
+# (dimension, sha256(text)). Filled by /api/tlx/validate as fields lose focus so
+# /api/tlx/submit only calls the LLM for text it hasn't seen. Only real LLM
+# answers are kept; offline fallbacks are cheap and shouldn't pin a verdict
+# made while the provider was down.
+FIELDS = ("llm_valid", "llm_reason", "llm_source", "llm_quality", "llm_likert", "llm_explanation")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").strip().encode("utf-8")).hexdigest()
+
+def cacheable(result: dict) -> bool:
+    return result.get("llm_source") == "llm"
+
+def lookup(db, texts: dict[str, str]) -> dict[str, dict]:
+    """{dimension: text} -> {dimension: cached result} for the pairs that are cached."""
+    from ..models import TlxValidationCache as C
+
+    if not texts:
+        return {}
+    wanted = {(d, text_hash(t)) for d, t in texts.items()}
+    # Both columns constrained so the (dimension, text_hash) unique index is
+    # searched (SQLite won't use it for a row-value IN); exact pairs filtered here.
+    rows = db.scalars(select(C).where(C.dimension.in_({d for d, _ in wanted}),
+                                      C.text_hash.in_({h for _, h in wanted}))).all()
+    return {r.dimension: {f: getattr(r, f) for f in FIELDS}
+            for r in rows if (r.dimension, r.text_hash) in wanted}
+
+def store(db, dimension: str, text: str, result: dict):
+    """Upserts one result; the rating fields are only overwritten when present."""
+    from ..models import TlxValidationCache as C
+
+    if not cacheable(result):
+        return
+    values = {f: result.get(f) for f in FIELDS if f in result}
+    if values.get("llm_explanation") == llm_tlx.OFFLINE_EXPLANATION:
+        # Rating fell back to the heuristic; keep the LLM verdict only.
+        values.pop("llm_likert", None)
+        values.pop("llm_explanation", None)
+    key = (C.dimension == dimension) & (C.text_hash == text_hash(text))
+    try:
+        if not db.execute(update(C).where(key).values(**values)).rowcount:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(C).values(dimension=dimension, text_hash=text_hash(text),
+                                                created_at=datetime.utcnow(), **values))
+            except IntegrityError:
+                db.execute(update(C).where(key).values(**values))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        log.warning("validation cache write failed: %s", e)
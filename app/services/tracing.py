@@ -0,0 +1,174 @@
+from __future__ import annotations
+import os, sys, json, time, threading, functools, re
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+# --- Config ---
+# PROFILE_SLOW_REQUESTS=1 traces every request; otherwise a request is traced only
+# when it carries `X-Profile: <PROFILE_HEADER_TOKEN>`. With neither set the middleware
+# is not installed and span() is a single ContextVar lookup.
+PROFILE_ALWAYS = os.getenv("PROFILE_SLOW_REQUESTS", "").lower() in {"1", "true", "on", "yes"}
+PROFILE_HEADER_TOKEN = os.getenv("PROFILE_HEADER_TOKEN", "")
+PROFILE_HEADER = "x-profile"
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", "500"))
+PROFILE_INTERVAL_S = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000.0
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+PROFILE_DIR = Path(os.getenv("DATA_DIR", "./data")) / "profiles"
+
+ACTIVE = PROFILE_ALWAYS or bool(PROFILE_HEADER_TOKEN)
+
+_current: ContextVar["Trace | None"] = ContextVar("trace", default=None)
+
+
+class Trace:
+    def __init__(self, method: str, path: str):
+        self.method, self.path = method, path
+        self.started_at = datetime.utcnow()
+        self.t0 = time.perf_counter()
+        self.spans: list[dict] = []
+        self.threads = {threading.get_ident()}
+        self.stacks: Counter = Counter()
+
+    def offset_ms(self, t: float) -> float:
+        return round((t - self.t0) * 1000.0, 3)
+
+
+class span:
+    """Records a timed span on the active trace; a no-op when nothing is being traced."""
+    __slots__ = ("name", "attrs", "trace", "t0")
+
+    def __init__(self, name: str, **attrs):
+        self.name, self.attrs, self.trace = name, attrs, None
+
+    def __enter__(self):
+        self.trace = _current.get()
+        if self.trace is not None:
+            self.trace.threads.add(threading.get_ident())
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        tr = self.trace
+        if tr is not None:
+            tr.spans.append({"name": self.name, "start_ms": tr.offset_ms(self.t0),
+                             "dur_ms": round((time.perf_counter() - self.t0) * 1000.0, 3),
+                             "thread": threading.get_ident(),
+                             "error": exc_type.__name__ if exc_type else None, **self.attrs})
+        return False
+
+
+def traced(name: str, key: int | None = None):
+    """Decorator form of span(); `key` names a positional arg to record as the span target."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            attrs = {"target": str(args[key])} if key is not None and len(args) > key else {}
+            with span(name, **attrs):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def instrument_engine(engine):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("trace_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        tr = _current.get()
+        stack = conn.info.get("trace_t0")
+        if tr is None or not stack:
+            return
+        t0 = stack.pop()
+        tr.threads.add(threading.get_ident())
+        tr.spans.append({"name": "db.query", "start_ms": tr.offset_ms(t0),
+                         "dur_ms": round((time.perf_counter() - t0) * 1000.0, 3),
+                         "thread": threading.get_ident(), "statement": " ".join(statement.split())[:200]})
+
+
+# --- Sampling profiler ---
+_active: set[Trace] = set()
+_active_lock = threading.Lock()
+_sampler: threading.Thread | None = None
+
+def _fold(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+def _sample_loop():
+    global _sampler
+    me = threading.get_ident()
+    while True:
+        with _active_lock:
+            traces = list(_active)
+            if not traces:
+                _sampler = None
+                return
+        frames = sys._current_frames()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for tr in traces:
+            for tid in tuple(tr.threads):
+                f = frames.get(tid)
+                if f is not None and tid != me:
+                    tr.stacks[f"{names.get(tid, tid)};{_fold(f)}"] += 1
+        del frames
+        time.sleep(PROFILE_INTERVAL_S)
+
+def wants(request) -> bool:
+    if PROFILE_ALWAYS:
+        return True
+    return bool(PROFILE_HEADER_TOKEN) and request.headers.get(PROFILE_HEADER) == PROFILE_HEADER_TOKEN
+
+def start(method: str, path: str):
+    global _sampler
+    tr = Trace(method, path)
+    with _active_lock:
+        _active.add(tr)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="profile-sampler", daemon=True)
+            _sampler.start()
+    return tr, _current.set(tr)
+
+def finish(tr: Trace, token, route: str, status: int):
+    _current.reset(token)
+    with _active_lock:
+        _active.discard(tr)
+    elapsed_ms = (time.perf_counter() - tr.t0) * 1000.0
+    if elapsed_ms >= PROFILE_THRESHOLD_MS:
+        try:
+            _dump(tr, route, status, elapsed_ms)
+        except OSError:
+            pass
+
+def _dump(tr: Trace, route: str, status: int, elapsed_ms: float):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r"[^a-zA-Z0-9]+", "-", route).strip("-") or "root"
+    stem = f"{tr.started_at.strftime('%Y%m%d_%H%M%S_%f')}_{tr.method}_{slug}_{int(elapsed_ms)}ms"
+    doc = {"method": tr.method, "path": tr.path, "route": route, "status": status,
+           "started_at": tr.started_at.isoformat(timespec="milliseconds"),
+           "elapsed_ms": round(elapsed_ms, 3), "sample_interval_ms": PROFILE_INTERVAL_S * 1000.0,
+           "spans": sorted(tr.spans, key=lambda s: s["start_ms"]),
+           "samples": sum(tr.stacks.values())}
+    (PROFILE_DIR / f"{stem}.json").write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    # Brendan Gregg "folded" format: feed to flamegraph.pl or speedscope.
+    (PROFILE_DIR / f"{stem}.folded").write_text(
+        "".join(f"{stack} {n}\n" for stack, n in tr.stacks.most_common()), encoding="utf-8")
+    _rotate()
+
+def _rotate():
+    dumps = sorted(PROFILE_DIR.glob("*.json"))
+    for old in dumps[:max(0, len(dumps) - PROFILE_KEEP)]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".folded").unlink(missing_ok=True)
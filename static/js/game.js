@@ -21,15 +21,55 @@
       })
   };
 
+  // Frame and input-to-paint latency for the current level, sent with level/complete.
+  class Telemetry {
+    constructor() { this.reset(); }
+    reset() { this.frames = []; this.inputs = []; this.longFrames = 0; this.bench = {}; }
+    frame(dt) {
+      if (dt > 1000) return;            // tab was hidden, rAF paused
+      if (dt > 50) this.longFrames++;
+      if (this.frames.length < 20000) this.frames.push(dt);
+    }
+    input(ms) { if (this.inputs.length < 5000) this.inputs.push(ms); }
+    static pct(xs, q) {
+      if (!xs.length) return null;
+      const s = xs.slice().sort((a, b) => a - b);
+      return s[Math.min(s.length - 1, Math.floor(q * s.length))];
+    }
+    summary() {
+      const P = Telemetry.pct;
+      return {
+        frames: this.frames.length, frame_ms_p50: P(this.frames, 0.5), frame_ms_p95: P(this.frames, 0.95),
+        frame_ms_max: P(this.frames, 1), long_frames: this.longFrames,
+        inputs: this.inputs.length, input_ms_p50: P(this.inputs, 0.5), input_ms_p95: P(this.inputs, 0.95),
+        input_ms_max: P(this.inputs, 1), ...this.bench, dpr: window.devicePixelRatio || 1
+      };
+    }
+  }
+
+  // Driven by requestAnimationFrame; the label is only touched when the second changes.
   class Timer {
-    constructor(el) { this.el = el; this.startTs = null; this.tid = null; this.ms = 0; }
-    start() { this.startTs = performance.now(); this.ms = 0; this.tid = setInterval(() => this.render(), 100); }
-    stop() { if (this.tid) { clearInterval(this.tid); this.tid = null; } }
+    constructor(el, onFrame) { this.el = el; this.onFrame = onFrame; this.startTs = null; this.stopTs = null; this.raf = null; this.shown = null; }
+    start() {
+      if (this.raf) cancelAnimationFrame(this.raf);
+      this.startTs = performance.now(); this.stopTs = null; this.shown = null;
+      let last = null;
+      const loop = (ts) => {
+        if (last !== null && this.onFrame) this.onFrame(ts - last);
+        last = ts; this.render(); this.raf = requestAnimationFrame(loop);
+      };
+      this.raf = requestAnimationFrame(loop);
+    }
+    stop() {
+      if (this.raf) { cancelAnimationFrame(this.raf); this.raf = null; }
+      if (this.startTs !== null && this.stopTs === null) { this.stopTs = performance.now(); this.render(); }
+    }
+    get ms() { return this.startTs === null ? 0 : (this.stopTs ?? performance.now()) - this.startTs; }
     render() {
-      const now = performance.now();
-      const ms = this.startTs ? (now - this.startTs) : 0;
-      this.ms = ms;
-      const s = Math.floor(ms / 1000), m = Math.floor(s / 60), rem = s % 60;
+      const s = Math.floor(this.ms / 1000);
+      if (s === this.shown) return;
+      this.shown = s;
+      const m = Math.floor(s / 60), rem = s % 60;
       this.el.textContent = `${m}:${rem.toString().padStart(2, '0')}`;
     }
     seconds() { return Math.floor(this.ms / 1000); }
@@ -52,6 +92,10 @@
       this.ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
 
       this.tileSize = this.logicalW / this.size;
+      this.ratio = ratio;
+      this.atlas = this.buildAtlas();
+      this.dirty = new Set(); this.fullRedraw = true; this.raf = null; this.pendingInputs = [];
+      this.telemetry = new Telemetry();
       canvas.addEventListener('click', (e) => this.onClick(e));
       this.reset();
     }
@@ -89,7 +133,10 @@
       const c = Math.floor(x / this.tileSize), r = Math.floor(y / this.tileSize);
       if (this.grid[r][c] === 0) return;
       if (this.canMove(r, c)) {
-        this.swap(r, c); this.moves++; this.updateHud(); this.draw();
+        const br = this.blank.r, bc = this.blank.c;
+        this.swap(r, c); this.moves++; this.updateHud();
+        this.pendingInputs.push(e.timeStamp);
+        this.invalidate(r, c); this.invalidate(br, bc);
         if (this.isSolved()) { this.solved = true; document.dispatchEvent(new CustomEvent('puzzle:solved', { detail: { moves: this.moves } })); }
       }
     }
@@ -100,16 +147,61 @@
       return true;
     }
 
-    draw() {
-      const ctx = this.ctx;
-      ctx.fillStyle = '#f8fafc'; ctx.fillRect(0, 0, this.logicalW, this.logicalH);
-      ctx.font = 'bold 36px system-ui, Arial, sans-serif'; ctx.textAlign = 'center'; ctx.textBaseline = 'middle';
-      for (let r = 0; r < 4; r++) for (let c = 0; c < 4; c++) {
-        const v = this.grid[r][c], x = c * this.tileSize, y = r * this.tileSize;
-        ctx.strokeStyle = '#111827'; ctx.lineWidth = 3; ctx.strokeRect(x, y, this.tileSize, this.tileSize);
-        if (v !== 0) { ctx.fillStyle = '#e5e7eb'; ctx.fillRect(x + 1, y + 1, this.tileSize - 2, this.tileSize - 2); ctx.fillStyle = '#111827'; ctx.fillText(String(v), x + this.tileSize / 2, y + this.tileSize / 2); }
+    // Tiles 0 (blank) .. 15 pre-rendered once, in device pixels, into an offscreen 4x4 atlas.
+    buildAtlas() {
+      const px = Math.round(this.tileSize * this.ratio);
+      const atlas = document.createElement('canvas');
+      atlas.width = px * this.size; atlas.height = px * this.size;
+      const ctx = atlas.getContext('2d');
+      ctx.font = `bold ${Math.round(36 * this.ratio)}px system-ui, Arial, sans-serif`; ctx.textAlign = 'center'; ctx.textBaseline = 'middle';
+      for (let v = 0; v < this.size * this.size; v++) {
+        const x = (v % this.size) * px, y = Math.floor(v / this.size) * px;
+        ctx.save(); ctx.beginPath(); ctx.rect(x, y, px, px); ctx.clip();
+        ctx.fillStyle = '#f8fafc'; ctx.fillRect(x, y, px, px);
+        if (v !== 0) {
+          ctx.fillStyle = '#e5e7eb'; ctx.fillRect(x + this.ratio, y + this.ratio, px - 2 * this.ratio, px - 2 * this.ratio);
+          ctx.fillStyle = '#111827'; ctx.fillText(String(v), x + px / 2, y + px / 2);
+        }
+        ctx.strokeStyle = '#111827'; ctx.lineWidth = 3 * this.ratio; ctx.strokeRect(x, y, px, px);
+        ctx.restore();
       }
+      this.atlasPx = px;
+      return atlas;
+    }
+
+    paintCell(r, c) {
+      const v = this.grid[r][c], px = this.atlasPx, ts = this.tileSize;
+      this.ctx.drawImage(this.atlas, (v % this.size) * px, Math.floor(v / this.size) * px, px, px, c * ts, r * ts, ts, ts);
     }
+
+    invalidate(r, c) { this.dirty.add(r * this.size + c); this.requestPaint(); }
+    draw() { this.fullRedraw = true; this.requestPaint(); }
+    requestPaint() { if (this.raf === null) this.raf = requestAnimationFrame(() => this.paint()); }
+
+    // Everything changed since the last frame is painted once, here.
+    paint() {
+      this.raf = null;
+      if (this.fullRedraw) {
+        for (let r = 0; r < this.size; r++) for (let c = 0; c < this.size; c++) this.paintCell(r, c);
+      } else {
+        for (const i of this.dirty) this.paintCell(Math.floor(i / this.size), i % this.size);
+      }
+      this.fullRedraw = false; this.dirty.clear();
+      if (this.pendingInputs.length) {
+        const inputs = this.pendingInputs; this.pendingInputs = [];
+        // Runs after the frame has been handed to the compositor.
+        setTimeout(() => { const now = performance.now(); inputs.forEach(t => this.telemetry.input(now - t)); }, 0);
+      }
+    }
+
+    // Mean cost of a full repaint vs. a two-tile repaint, measured on this machine.
+    benchmark(iterations = 30) {
+      const time = (fn) => { const t0 = performance.now(); for (let i = 0; i < iterations; i++) fn(); return (performance.now() - t0) / iterations; };
+      const full = time(() => { for (let r = 0; r < this.size; r++) for (let c = 0; c < this.size; c++) this.paintCell(r, c); });
+      const dirty = time(() => { this.paintCell(this.blank.r, this.blank.c); this.paintCell(0, 0); });
+      this.telemetry.bench = { bench_full_ms: full, bench_dirty_ms: dirty };
+    }
+
     manhattanSum() {
       let sum = 0;
       for (let r = 0; r < 4; r++) {
@@ -182,7 +274,7 @@
     const messageEl = document.getElementById('message');
 
     const pz = new Puzzle(canvas, movesEl);
-    const timer = new Timer(timerEl);
+    const timer = new Timer(timerEl, (dt) => pz.telemetry.frame(dt));
 
     let currentMinTime = 0; let quitWatch = null;
     const stopQuitWatch = () => { if (quitWatch) { clearInterval(quitWatch); quitWatch = null; } };
@@ -194,12 +286,86 @@
       else    { el.classList.add('hidden');     el.classList.remove('flex'); }
     }
 
+    // Per-field speculative validation: when a descriptive field loses focus,
+    // ask the server to check it (debounced) so submit can reuse the verdict.
+    const fieldChecks = {};   // dim -> { text, timer }
+    function setFieldHint(dim, text, bad) {
+      const id = 'tlx_text_' + dim.replace(/\s+/g, '_');
+      document.getElementById(id)?.classList.toggle('border-red-500', !!bad);
+      const hint = document.getElementById(id + '_hint');
+      if (hint) {
+        hint.textContent = text;
+        hint.classList.toggle('text-red-600', !!bad);
+      }
+    }
+    function scheduleFieldCheck(dim, el) {
+      const st = fieldChecks[dim] || (fieldChecks[dim] = { text: null, timer: null });
+      clearTimeout(st.timer);
+      st.timer = setTimeout(async () => {
+        const text = (el.value || '').trim();
+        if (!text || text === st.text) return;
+        st.text = text;
+        try {
+          const r = await fetch('/api/tlx/validate', {
+            method: 'POST', headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ index: currentIndex, dimension: dim, text })
+          });
+          const j = await r.json().catch(() => ({}));
+          if ((el.value || '').trim() !== text) return;   // edited since; a newer check will follow
+          if (!r.ok || !j.checked) { st.text = null; return; }
+          setFieldHint(dim, j.passed ? '✓ Looks good' : j.reason, !j.passed);
+        } catch { st.text = null; }
+      }, 400);
+    }
+
+    // POSTs to the SSE endpoint and calls onEvent(event, data) per frame.
+    // Resolves with the final {event, data} ('done' or 'busy'), or
+    // {event: 'error', status, data} when the request itself failed.
+    async function streamDescriptive(notes, onEvent) {
+      let r;
+      try {
+        r = await fetch('/api/tlx/submit/stream', {
+          method: 'POST', headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ index: currentIndex, notes })
+        });
+      } catch (e) {
+        return { event: 'error', status: 0, data: {} };
+      }
+      if (!r.ok || !r.body) {
+        return { event: 'error', status: r.status, data: await r.json().catch(() => ({})) };
+      }
+      const reader = r.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buf = '', last = { event: 'error', status: r.status, data: {} };
+      for (;;) {
+        const { value, done } = await reader.read().catch(() => ({ done: true }));
+        if (done) break;
+        buf += value;
+        let cut;
+        while ((cut = buf.indexOf('\n\n')) >= 0) {
+          const frame = buf.slice(0, cut); buf = buf.slice(cut + 2);
+          let event = 'message', data = '';
+          frame.split('\n').forEach(line => {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+          });
+          let parsed = {};
+          try { parsed = JSON.parse(data || '{}'); } catch {}
+          onEvent(event, parsed);
+          if (event === 'done' || event === 'busy') last = { event, status: r.status, data: parsed };
+        }
+      }
+      return last;
+    }
+
     function resetTlxInputs() {
       (window.TLX_DIMS || []).forEach(dim => {
         const safe = dim.replace(/\s+/g, '_');
         const s = document.getElementById('tlx_' + safe); if (s) s.value = 4;
         const t = document.getElementById('tlx_text_' + safe);
         if (t) { t.value = ''; t.classList.remove('border-red-500'); }
+        const h = document.getElementById('tlx_text_' + safe + '_hint');
+        if (h) { h.textContent = ''; h.classList.remove('text-red-600'); }
+        if (fieldChecks[dim]) { clearTimeout(fieldChecks[dim].timer); delete fieldChecks[dim]; }
       });
       const msgS = document.getElementById('tlxMsg');     if (msgS) msgS.textContent = '';
       const msgD = document.getElementById('tlxMsgDesc'); if (msgD) msgD.textContent = '';
@@ -227,6 +393,11 @@
       modal.classList.remove('hidden'); modal.classList.add('flex');
 
       if (!window._tlxBound) {
+        (window.TLX_DIMS || []).forEach(dim => {
+          const el = document.getElementById('tlx_text_' + dim.replace(/\s+/g, '_'));
+          el?.addEventListener('blur', () => scheduleFieldCheck(dim, el));
+          el?.addEventListener('input', () => clearTimeout(fieldChecks[dim]?.timer));
+        });
         document.getElementById('tlxSubmitSlider')?.addEventListener('click', async () => {
           const ratings = {};
           (window.TLX_DIMS || []).forEach(dim => {
@@ -258,35 +429,40 @@
 
           console.log('[TLX] submit descriptive', { index: currentIndex, notes });
           tlxBusy(true); btn.disabled = true;
-          document.getElementById('tlxMsgDesc').textContent = 'Validating responses…';
-
-          const r = await fetch('/api/tlx/submit', {
-            method:'POST', headers:{'Content-Type':'application/json'},
-            body: JSON.stringify({ index: currentIndex, type:'descriptive', notes })
-          });
-          const j = await r.json().catch(()=>({}));
-          console.log('[TLX] descriptive response', r.status, j);
-
-          (window.TLX_DIMS || []).forEach(dim => {
-            const id = 'tlx_text_' + dim.replace(/\s+/g,'_');
-            document.getElementById(id)?.classList.remove('border-red-500');
+          const msgEl = document.getElementById('tlxMsgDesc');
+          msgEl.textContent = 'Validating responses…';
+          (window.TLX_DIMS || []).forEach(dim => setFieldHint(dim, '', false));
+
+          // Results stream in per dimension, so failed fields are flagged (and
+          // editable) while the others are still being checked.
+          const total = (window.TLX_DIMS || []).length;
+          let checked = 0;
+          const end = await streamDescriptive(notes, (ev, data) => {
+            if (ev === 'validated') {
+              checked++;
+              setFieldHint(data.dimension, data.passed ? '✓ Looks good' : data.reason, !data.passed);
+              msgEl.textContent = `Checked ${checked}/${total}…`;
+            }
           });
+          console.log('[TLX] descriptive response', end);
 
           tlxBusy(false); btn.disabled = false;
 
-          if (r.ok && j.ok) {
-            document.getElementById('tlxMsgDesc').textContent = '';
+          if (end.event === 'done' && end.data.ok) {
+            msgEl.textContent = '';
             if (pendingTlx.length > 0) openTLXModal(pendingTlx.shift(), currentIndex);
             else { closeTLXModal(); nextLevel(); }
+          } else if (end.event === 'busy' || end.status === 429) {
+            const wait = parseInt(end.data.retry_after || '5', 10);
+            msgEl.textContent = `The server is busy right now. Please try submitting again in ${wait} seconds.`;
           } else {
-            const fails = j.failed || [];
-            let msg = `Please revise:\n`;
+            const fails = end.data.failed || [];
+            let msg = fails.length ? `Please revise:\n` : (end.data.detail || 'Submission failed, please try again.');
             fails.forEach(f => {
-              const id = 'tlx_text_' + f.dimension.replace(/\s+/g,'_');
-              document.getElementById(id)?.classList.add('border-red-500');
+              setFieldHint(f.dimension, f.reason, true);
               msg += `• ${f.dimension}: ${f.reason}\n`;
             });
-            document.getElementById('tlxMsgDesc').textContent = msg.trim();
+            msgEl.textContent = msg.trim();
           }
         });
 
@@ -322,6 +498,7 @@
       }
       submitBtn.disabled = false;
       currentMinTime = r.min_time || 0;
+      pz.telemetry.reset(); pz.benchmark();
       timer.start();
       quitBtn.disabled = true;
       stopQuitWatch();
@@ -339,7 +516,7 @@
 
     async function completeLevel(asCompleted) {
       submitBtn.disabled = true; quitBtn.disabled = true;
-      const resp = await API.levelComplete({ index: currentIndex, moves: pz.moves, time_ms: Math.round(timer.ms), completed: !!asCompleted });
+      const resp = await API.levelComplete({ index: currentIndex, moves: pz.moves, time_ms: Math.round(timer.ms), completed: !!asCompleted, telemetry: pz.telemetry.summary() });
       const payload = resp.json || {}; const code = payload.error || payload.detail || '';
       const remaining = typeof payload.min_remaining === 'number' ? payload.min_remaining : null;
 
@@ -349,7 +526,7 @@
           remain -= 1; messageEl.textContent = `Please keep this page open — ${remain}s remaining...`;
           if (remain <= 0) {
             clearInterval(tick);
-            const retry = await API.levelComplete({ index: currentIndex, moves: pz.moves, time_ms: Math.round(timer.ms), completed: !!asCompleted });
+            const retry = await API.levelComplete({ index: currentIndex, moves: pz.moves, time_ms: Math.round(timer.ms), completed: !!asCompleted, telemetry: pz.telemetry.summary() });
             if (retry.ok) {
               messageEl.textContent = 'Recorded. Please complete a short questionnaire.';
               pendingTlx = (tlxOrdersByIndex[currentIndex] || []).slice();